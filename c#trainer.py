@@ -1,10 +1,27 @@
+import time
+# Taken before the other imports so --profile-startup can include their cost
+STARTUP_BEGIN = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-import subprocess
-import tempfile
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import os
 import json
 import textwrap
+import argparse
+import atexit
+import itertools
+import contextlib
+import threading
+import codecs
+import collections
+import hashlib
+import re
+import sys
+import queue
+import bisect
+import heapq
+import operator
+import math
 
 # ---------------------------
 # Module Content Definitions
@@ -415,10 +432,14 @@ modules = {
     "References": references_content
 }
 
-# Quiz data: a list of dictionaries with question, options, and correct answer index
+# Built-in quiz questions: id, module and difficulty tags, question, options and correct answer index.
+# They form the start of the question bank; more can be loaded with --question-bank.
 quizzes = [
     {
-        "question": "1) What is C# primarily used for?",
+        "id": "core-1",
+        "module": "Introduction",
+        "difficulty": "easy",
+        "question": "What is C# primarily used for?",
         "options": [
             "Building .NET applications",
             "Low-level hardware programming",
@@ -428,7 +449,10 @@ quizzes = [
         "answer": 0
     },
     {
-        "question": "2) Which keyword introduces asynchronous programming in C#?",
+        "id": "core-2",
+        "module": "Advanced Topics",
+        "difficulty": "medium",
+        "question": "Which keyword introduces asynchronous programming in C#?",
         "options": [
             "async/await",
             "goto/await",
@@ -438,7 +462,10 @@ quizzes = [
         "answer": 0
     },
     {
-        "question": "3) LINQ is used for:",
+        "id": "core-3",
+        "module": "Advanced Topics",
+        "difficulty": "medium",
+        "question": "LINQ is used for:",
         "options": [
             "Networking operations",
             "Database schema migrations",
@@ -448,7 +475,10 @@ quizzes = [
         "answer": 2
     },
     {
-        "question": "4) What is the purpose of the 'using' statement in C#?",
+        "id": "core-4",
+        "module": "Basics",
+        "difficulty": "medium",
+        "question": "What is the purpose of the 'using' statement in C#?",
         "options": [
             "To include namespaces",
             "To handle exceptions",
@@ -458,7 +488,10 @@ quizzes = [
         "answer": 2
     },
     {
-        "question": "5) Which design pattern ensures a class has only one instance?",
+        "id": "core-5",
+        "module": "Advanced Topics",
+        "difficulty": "hard",
+        "question": "Which design pattern ensures a class has only one instance?",
         "options": [
             "Factory Pattern",
             "Singleton Pattern",
@@ -469,15 +502,3479 @@ quizzes = [
     }
 ]
 
-# Progress file path
+# ---------------------------
+# Document Model
+# ---------------------------
+
+class Node:
+    # Immutable, slot-only base for parsed content; values are assigned positionally from __slots__
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(repr(getattr(self, name)) for name in self.__slots__))
+
+    def __reduce__(self):
+        # Pickle through the constructor since attribute assignment is blocked
+        return type(self), tuple(getattr(self, name) for name in self.__slots__)
+
+
+class Span(Node):
+    # style is "text", "bold" or "code"
+    __slots__ = ("text", "style")
+
+
+class Paragraph(Node):
+    __slots__ = ("spans",)
+
+
+class ListItem(Node):
+    __slots__ = ("spans",)
+
+
+class Heading(Node):
+    __slots__ = ("text", "level")
+
+
+class CodeBlock(Node):
+    __slots__ = ("code", "language")
+
+
+class BlankLine(Node):
+    __slots__ = ()
+
+
+class Section(Node):
+    __slots__ = ("heading", "blocks")
+
+
+class Document(Node):
+    __slots__ = ("title", "sections")
+
+
+BLANK_LINE = BlankLine()
+INLINE_RE = re.compile(r"\*\*(.+?)\*\*|`([^`]+)`")
+BOLD_LINE_RE = re.compile(r"^\*\*([^*]+)\*\*$")
+
+# Parsed documents by module title, together with the module dict they were parsed from
+_documents = {}
+
+
+def parse_spans(line):
+    spans = []
+    position = 0
+    for match in INLINE_RE.finditer(line):
+        if match.start() > position:
+            spans.append(Span(line[position:match.start()], "text"))
+        if match.group(1) is not None:
+            spans.append(Span(match.group(1), "bold"))
+        else:
+            spans.append(Span(match.group(2), "code"))
+        position = match.end()
+    if position < len(line) or not spans:
+        spans.append(Span(line[position:], "text"))
+    return tuple(spans)
+
+
+def parse_blocks(content):
+    # Single pass over a section body; fenced blocks keep their language tag
+    blocks = []
+    code_lines = None
+    language = ""
+
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if code_lines is not None:
+            if stripped == "```":
+                blocks.append(CodeBlock("".join(code_line + '\n' for code_line in code_lines), language))
+                code_lines = None
+            else:
+                code_lines.append(line)
+        elif stripped.startswith("```"):
+            code_lines = []
+            language = stripped[3:].strip().lower()
+        elif not stripped:
+            blocks.append(BLANK_LINE)
+        elif BOLD_LINE_RE.match(stripped):
+            blocks.append(Heading(BOLD_LINE_RE.match(stripped).group(1), 3))
+        elif stripped.startswith("- "):
+            blocks.append(ListItem(parse_spans(stripped[2:])))
+        else:
+            blocks.append(Paragraph(parse_spans(line)))
+
+    if code_lines is not None:
+        # Unterminated fence: keep what was written rather than dropping it
+        blocks.append(CodeBlock("".join(code_line + '\n' for code_line in code_lines), language))
+    return tuple(blocks)
+
+
+def parse_module(module):
+    # Parse a module once; later calls return the memoized Document until the module dict is replaced
+    cached = _documents.get(module["title"])
+    if cached is not None and cached[0] is module:
+        return cached[1]
+    document = Document(module["title"], tuple(Section(section["heading"], parse_blocks(section["content"]))
+                                               for section in module["sections"]))
+    _documents[module["title"]] = (module, document)
+    return document
+
+
+def iter_snippets(modules):
+    # Yield (module name, section heading, index within section, source) for every C# code block
+    for module_name, module in modules.items():
+        for section in parse_module(module).sections:
+            index = 0
+            for block in section.blocks:
+                if isinstance(block, CodeBlock) and block.language == "csharp":
+                    index += 1
+                    yield module_name, section.heading, index, block.code
+
+
+def benchmark_parse(lines=5000, repeat=20, stream=sys.stdout):
+    # Compare the per-display line scan the renderer used to do with parse-once + memoized lookups
+    body = []
+    for index in range(max(1, lines // 10)):
+        body += ["**Heading %d:**" % index, "- **Item:** a list entry with `code`", "Some prose line.", "",
+                 "```csharp", "int x = %d;" % index, "Console.WriteLine(x);", "```", "", "More prose."]
+    module = {"title": "Parse Benchmark", "sections": [{"heading": "Section", "content": "\n".join(body)}]}
+
+    def legacy_scan(content):
+        # The original insert_content loop, minus widget creation
+        items = []
+        in_code_block = False
+        code_text = ""
+        for line in content.split('\n'):
+            if line.strip().startswith("```csharp"):
+                in_code_block = True
+                code_text = ""
+                continue
+            elif line.strip() == "```" and in_code_block:
+                in_code_block = False
+                items.append(code_text)
+                continue
+            if in_code_block:
+                code_text += line + '\n'
+            else:
+                items.append(line)
+        return items
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for section in module["sections"]:
+            legacy_scan(section["content"])
+    legacy = time.perf_counter() - started
+
+    _documents.pop(module["title"], None)
+    started = time.perf_counter()
+    parse_module(module)
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(repeat - 1):
+        parse_module(module)
+    memoized = time.perf_counter() - started
+    _documents.pop(module["title"], None)
+
+    print("%d lines, %d displays" % (len(body), repeat), file=stream)
+    print("  line scan on every display: %.2f ms" % (legacy * 1000), file=stream)
+    print("  parse once + memoized:      %.2f ms (first parse %.2f ms)" % ((first + memoized) * 1000, first * 1000),
+          file=stream)
+    return legacy, first + memoized
+
+
+# Per-user directory for caches that outlive a session
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".csharp_trainer")
+
+# ---------------------------
+# Tracing
+# ---------------------------
+
+# Histogram bucket upper bounds in seconds, shared by every span name
+TRACE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent spans kept for Chrome trace export
+TRACE_MAX_EVENTS = 20000
+
+
+class SpanStats:
+    __slots__ = ("count", "total", "maximum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        # One extra bucket for values above the last bound
+        self.buckets = [0] * (len(TRACE_BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+        self.buckets[bisect.bisect_left(TRACE_BUCKETS, duration)] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th value, capped by the largest value seen
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(TRACE_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+
+class Tracer:
+    # Thread-safe span recorder: per-name histograms for the summary and Prometheus export,
+    # plus a bounded event list for Chrome traces
+
+    def __init__(self, max_events=TRACE_MAX_EVENTS):
+        self.stats = {}
+        self.events = collections.deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started, time.perf_counter(), args)
+
+    def record(self, name, started, ended, args=None):
+        duration = ended - started
+        event = (name, started, duration, threading.get_ident(), args)
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+            stats.add(duration)
+            self.events.append(event)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.events.clear()
+
+    def summary(self):
+        # (name, count, mean, p50, p95, max) in seconds, sorted by total time spent
+        with self._lock:
+            items = list(self.stats.items())
+        items.sort(key=lambda item: -item[1].total)
+        return [(name, stats.count, stats.total / stats.count, stats.quantile(0.5), stats.quantile(0.95), stats.maximum)
+                for name, stats in items]
+
+    def prometheus_text(self):
+        lines = ["# HELP csharp_trainer_span_seconds Duration of instrumented operations.",
+                 "# TYPE csharp_trainer_span_seconds histogram"]
+        with self._lock:
+            items = sorted(self.stats.items())
+            for name, stats in items:
+                cumulative = 0
+                for bound, count in zip(TRACE_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append('csharp_trainer_span_seconds_bucket{span="%s",le="%g"} %d' % (name, bound, cumulative))
+                lines.append('csharp_trainer_span_seconds_bucket{span="%s",le="+Inf"} %d' % (name, stats.count))
+                lines.append('csharp_trainer_span_seconds_sum{span="%s"} %.6f' % (name, stats.total))
+                lines.append('csharp_trainer_span_seconds_count{span="%s"} %d' % (name, stats.count))
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self):
+        # Complete ("X") events in microseconds, loadable in chrome://tracing or Perfetto
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        return {"traceEvents": [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                                 "ts": round((started - self.origin) * 1e6, 1), "dur": round(duration * 1e6, 1),
+                                 "args": args or {}}
+                                for name, started, duration, tid, args in events],
+                "displayTimeUnit": "ms"}
+
+
+# Process-wide tracer used by the execution, rendering, search and progress code paths
+tracer = Tracer()
+
+
+# ---------------------------
+# Progress Store
+# ---------------------------
+
+# Old progress file, read from the working directory once and imported into the database
 PROGRESS_FILE = "progress.json"
+# One database may be shared by every learner of a lab install (see --progress-db)
+PROGRESS_DB_FILE = os.path.join(APP_DATA_DIR, "progress.db")
+PROGRESS_FLUSH_DELAY = 1.0
+PROGRESS_SCHEMA_VERSION = 3
+
+# Completion kind -> key in the progress dict the app works with
+PROGRESS_KEYS = {"module": "completed_modules", "quiz": "completed_quizzes"}
+SUMMARY_KEYS = {"module": "modules_completed", "quiz": "quizzes_completed"}
+
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS learners (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS completions (
+    learner_id INTEGER NOT NULL REFERENCES learners(id),
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, kind, name)
+);
+CREATE INDEX IF NOT EXISTS completions_by_name ON completions (kind, name);
+CREATE TABLE IF NOT EXISTS quiz_attempts (
+    id INTEGER PRIMARY KEY,
+    learner_id INTEGER NOT NULL REFERENCES learners(id),
+    quiz TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    attempted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quiz_attempts_by_learner ON quiz_attempts (learner_id, quiz);
+CREATE TABLE IF NOT EXISTS snippet_runs (
+    id INTEGER PRIMARY KEY,
+    learner_id INTEGER NOT NULL REFERENCES learners(id),
+    module TEXT,
+    snippet TEXT NOT NULL,
+    state TEXT NOT NULL,
+    returncode INTEGER,
+    ran_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snippet_runs_by_learner ON snippet_runs (learner_id);
+CREATE TABLE IF NOT EXISTS notes (
+    learner_id INTEGER NOT NULL REFERENCES learners(id),
+    module TEXT NOT NULL,
+    section TEXT NOT NULL,
+    body TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, module, section)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over note bodies, kept in sync by triggers. Created only when SQLite has FTS5;
+# otherwise note search falls back to a substring scan.
+NOTES_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE notes_fts USING fts5(body, content='notes', content_rowid='rowid')",
+    "CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts (rowid, body) VALUES (new.rowid, new.body); END",
+    "CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts (notes_fts, rowid, body) VALUES ('delete', old.rowid, old.body); END",
+    "CREATE TRIGGER notes_fts_update AFTER UPDATE OF body ON notes BEGIN "
+    "INSERT INTO notes_fts (notes_fts, rowid, body) VALUES ('delete', old.rowid, old.body); "
+    "INSERT INTO notes_fts (rowid, body) VALUES (new.rowid, new.body); END",
+    "INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')",
+)
+NOTE_SEARCH_LIMIT = 100
+NOTE_PREVIEW_CHARS = 80
+
+# Row layouts queued by record_*; the learner id is filled in when the batch is written
+PROGRESS_INSERTS = {
+    "completion": "INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?)",
+    "quiz_attempt": "INSERT INTO quiz_attempts (learner_id, quiz, score, total, attempted_at) VALUES (?, ?, ?, ?, ?)",
+    "snippet_run": "INSERT INTO snippet_runs (learner_id, module, snippet, state, returncode, ran_at) "
+                   "VALUES (?, ?, ?, ?, ?, ?)",
+    "clear_notes": "DELETE FROM notes WHERE learner_id = ?",
+    # Upsert rather than INSERT OR REPLACE: REPLACE deletes without firing the FTS delete trigger
+    "note": "INSERT INTO notes VALUES (?, ?, ?, ?, ?) ON CONFLICT (learner_id, module, section) "
+            "DO UPDATE SET body = excluded.body, updated_at = excluded.updated_at",
+    "delete_note": "DELETE FROM notes WHERE learner_id = ? AND module = ? AND section = ?",
+}
+
+def default_learner():
+    import getpass
+    try:
+        return getpass.getuser()
+    except (OSError, KeyError, ImportError):
+        # getuser() raises when no login name can be found (e.g. a bare container)
+        return "learner"
+
+class ProgressStore:
+    # SQLite in WAL mode; rows are queued and written in one transaction after a quiet period.
+    # Several app instances (one per learner) may write to the same file concurrently.
+
+    def __init__(self, path=PROGRESS_DB_FILE, learner=None, legacy_file=PROGRESS_FILE,
+                 flush_delay=PROGRESS_FLUSH_DELAY):
+        self.path = path
+        self.learner = learner or default_learner()
+        self.legacy_file = legacy_file
+        self.flush_delay = flush_delay
+        self.learner_id = None
+        self.notes_fts = False
+        self._conn = None
+        # Separate connection for the notes reads made on the UI thread (see _read)
+        self._read_conn = None
+        self._pending = []
+        # (module, section) -> latest note body; repeated edits of one note are written once
+        self._pending_notes = {}
+        # Rows and notes of the batch being written, still visible to reads until it commits
+        self._flushing = ([], {})
+        self._timer = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _connect(self):
+        import sqlite3
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Flushes run on a timer thread; _write_lock serializes every use of the connection.
+            # Other processes are waited on for up to `timeout` seconds when they hold the write lock.
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+            with self._transaction():
+                self._migrate()
+        return self._conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue on the busy
+        # timeout instead of failing when a read transaction tries to upgrade
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _migrate(self):
+        conn = self._conn
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(completions)")]
+        single_learner = bool(columns) and "learner_id" not in columns
+        if single_learner:
+            # Version 1 had one anonymous learner; its rows move to whoever opens the database first
+            conn.execute("ALTER TABLE completions RENAME TO completions_v1")
+        for statement in PROGRESS_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        if single_learner:
+            conn.execute("INSERT OR IGNORE INTO completions SELECT ?, kind, name, completed_at FROM completions_v1",
+                         (self._learner_id(),))
+            conn.execute("DROP TABLE completions_v1")
+        self._create_notes_fts()
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(PROGRESS_SCHEMA_VERSION),))
+
+    def _create_notes_fts(self):
+        import sqlite3
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone():
+            self.notes_fts = True
+            return
+        try:
+            conn.execute(NOTES_FTS_SCHEMA[0])
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            return
+        for statement in NOTES_FTS_SCHEMA[1:]:
+            conn.execute(statement)
+        self.notes_fts = True
+
+    def _learner_id(self):
+        # The profile row is created the first time this learner writes or loads progress
+        if self.learner_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO learners (name, created_at) VALUES (?, ?)",
+                               (self.learner, time.time()))
+            self.learner_id = self._conn.execute("SELECT id FROM learners WHERE name = ?",
+                                                 (self.learner,)).fetchone()[0]
+        return self.learner_id
+
+    def _import_legacy(self):
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        rows = []
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, "r") as f:
+                    legacy = json.load(f)
+                stamp = os.path.getmtime(self.legacy_file)
+            except (OSError, ValueError) as exc:
+                print("Could not import %s: %s" % (self.legacy_file, exc), file=sys.stderr)
+                return
+            for kind, key in PROGRESS_KEYS.items():
+                rows.extend((self._learner_id(), kind, name, stamp) for name in legacy.get(key, []))
+        conn.executemany(PROGRESS_INSERTS["completion"], rows)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('legacy_imported', ?)", (self.legacy_file,))
+
+    def load(self):
+        progress = {key: [] for key in PROGRESS_KEYS.values()}
+        with self._write_lock, tracer.span("progress.load"):
+            self._connect()
+            with self._transaction() as conn:
+                self._learner_id()
+                self._import_legacy()
+            rows = conn.execute("SELECT kind, name FROM completions WHERE learner_id = ? ORDER BY completed_at",
+                                (self.learner_id,)).fetchall()
+        for kind, name in rows:
+            if kind in PROGRESS_KEYS:
+                progress[PROGRESS_KEYS[kind]].append(name)
+        return progress
+
+    def _queue(self, insert, row):
+        # Called on the UI thread; only queues the row and (re)starts the debounce timer
+        with self._lock:
+            self._pending.append((insert, row))
+            self._schedule()
+
+    def _schedule(self):
+        # Caller holds _lock
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def record(self, kind, name):
+        self._queue("completion", (kind, name, time.time()))
+
+    def record_quiz_attempt(self, quiz, score, total):
+        self._queue("quiz_attempt", (quiz, score, total, time.time()))
+
+    def record_snippet_run(self, module, snippet, state, returncode):
+        self._queue("snippet_run", (module, snippet, state, returncode, time.time()))
+
+    def save_note(self, module, section, body):
+        # An empty body deletes the note
+        with self._lock:
+            self._pending_notes[(module, section)] = body
+            self._schedule()
+
+    def clear_notes(self):
+        with self._lock:
+            self._pending_notes.clear()
+            self._pending.append(("clear_notes", ()))
+            self._schedule()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                notes, self._pending_notes = self._pending_notes, {}
+                self._flushing = (pending, notes)
+                self._timer = None
+            if not pending and not notes:
+                return True
+            written = self._write_batch(pending, notes)
+            with self._lock:
+                self._flushing = ([], {})
+                if not written:
+                    # The batch goes back to the front of the queue for the next flush
+                    # (at the latest the one in close())
+                    cleared = any(insert == "clear_notes" for insert, _ in self._pending)
+                    self._pending[:0] = pending
+                    if not cleared:
+                        for key, body in notes.items():
+                            # Edits queued since the batch was taken are newer
+                            self._pending_notes.setdefault(key, body)
+        return written
+
+    def _write_batch(self, pending, notes):
+        # Caller holds _write_lock
+        import sqlite3
+        with tracer.span("progress.flush", rows=len(pending) + len(notes)):
+            learner_id = self.learner_id
+            try:
+                self._connect()
+                # One transaction per batch: either every queued row lands or none does
+                with self._transaction() as conn:
+                    self._learner_id()
+                    for insert, row in pending:
+                        conn.execute(PROGRESS_INSERTS[insert], (self.learner_id,) + row)
+                    # Notes go last, so a note written after "Clear Notes" survives the clear
+                    stamp = time.time()
+                    for (module, section), body in notes.items():
+                        if body:
+                            conn.execute(PROGRESS_INSERTS["note"], (self.learner_id, module, section, body, stamp))
+                        else:
+                            conn.execute(PROGRESS_INSERTS["delete_note"], (self.learner_id, module, section))
+            except (OSError, sqlite3.Error) as exc:
+                # Usually "database is locked" on a busy shared file
+                self.learner_id = learner_id
+                print("Could not save progress to %s: %s" % (self.path, exc), file=sys.stderr)
+                return False
+        return True
+
+    def _read_connection(self):
+        # In WAL mode this connection sees the last committed state and never waits for a writer,
+        # so reads do not block behind a flush that is waiting on a busy shared database
+        import sqlite3
+        with self._read_lock:
+            if self._read_conn is None:
+                if self._conn is None:
+                    # Creates the schema on first use
+                    with self._write_lock:
+                        self._connect()
+                self._read_conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False,
+                                                  isolation_level=None)
+            return self._read_conn
+
+    def _read(self, sql, args=()):
+        # Rows of this learner; queued writes are not visible here (see _pending_view)
+        conn = self._read_connection()
+        with self._read_lock:
+            learner_id = self.learner_id
+            if learner_id is None:
+                row = conn.execute("SELECT id FROM learners WHERE name = ?", (self.learner,)).fetchone()
+                if row is None:
+                    return []
+                learner_id = row[0]
+            return conn.execute(sql, (learner_id,) + tuple(args)).fetchall()
+
+    def _pending_view(self):
+        # Whether a Clear Notes is queued or being written, and the note bodies not yet committed,
+        # replayed in the order flush() writes them
+        cleared = False
+        notes = {}
+        with self._lock:
+            for rows, batch_notes in (self._flushing, (self._pending, self._pending_notes)):
+                if any(insert == "clear_notes" for insert, _ in rows):
+                    cleared = True
+                    notes.clear()
+                notes.update(batch_notes)
+        return cleared, notes
+
+    def get_note(self, module, section):
+        cleared, notes = self._pending_view()
+        if (module, section) in notes:
+            return notes[(module, section)]
+        if cleared:
+            return ""
+        rows = self._read("SELECT body FROM notes WHERE learner_id = ? AND module = ? AND section = ?",
+                          (module, section))
+        return rows[0][0] if rows else ""
+
+    def list_notes(self):
+        # [(module, section, preview)], most recently edited first; bodies are not loaded in full.
+        # Queued edits are laid over the stored rows.
+        rows = self._read("SELECT module, section, substr(body, 1, %d) FROM notes WHERE learner_id = ? "
+                          "ORDER BY updated_at DESC" % NOTE_PREVIEW_CHARS)
+        cleared, notes = self._pending_view()
+        if cleared:
+            rows = []
+        queued = [(module, section, body[:NOTE_PREVIEW_CHARS])
+                  for (module, section), body in reversed(list(notes.items())) if body]
+        return queued + [row for row in rows if (row[0], row[1]) not in notes]
+
+    def search_notes(self, query, limit=NOTE_SEARCH_LIMIT):
+        # [(module, section, excerpt)], best match first. Searches the stored notes, minus those
+        # deleted by queued edits; new text is found once the debounced flush has written it.
+        words = query.split()
+        if not words:
+            return self.list_notes()[:limit]
+        cleared, notes = self._pending_view()
+        if cleared:
+            return []
+        return [row for row in self._search_stored(words, limit) if notes.get((row[0], row[1])) != ""]
+
+    def _search_stored(self, words, limit):
+        self._read_connection()
+        if self.notes_fts:
+            # Words are quoted so FTS operators in the query are taken literally; the last one is a prefix
+            match = " ".join('"%s"' % word.replace('"', '""') for word in words) + "*"
+            return self._read("SELECT notes.module, notes.section, snippet(notes_fts, 0, '[', ']', '...', 12) "
+                              "FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid "
+                              "WHERE notes.learner_id = ? AND notes_fts MATCH ? ORDER BY rank LIMIT ?",
+                              (match, limit))
+        conditions = " AND ".join(["instr(lower(body), ?) > 0"] * len(words))
+        return self._read("SELECT module, section, substr(body, 1, %d) FROM notes WHERE learner_id = ? AND %s "
+                          "ORDER BY updated_at DESC LIMIT ?" % (NOTE_PREVIEW_CHARS, conditions),
+                          [word.lower() for word in words] + [limit])
+
+    def class_summary(self):
+        # One row per learner, built from three grouped scans instead of per-learner queries
+        with self._write_lock:
+            conn = self._connect()
+            learners = conn.execute("SELECT id, name FROM learners ORDER BY name").fetchall()
+            completions = conn.execute("SELECT learner_id, kind, COUNT(*) FROM completions "
+                                       "GROUP BY learner_id, kind").fetchall()
+            attempts = conn.execute("SELECT learner_id, COUNT(*), MAX(CAST(score AS REAL) / total) "
+                                    "FROM quiz_attempts WHERE total > 0 GROUP BY learner_id").fetchall()
+            runs = conn.execute("SELECT learner_id, COUNT(*), SUM(state = 'finished' AND returncode = 0) "
+                                "FROM snippet_runs GROUP BY learner_id").fetchall()
+
+        summary = collections.OrderedDict()
+        for learner_id, name in learners:
+            summary[learner_id] = {"learner": name, "modules_completed": 0, "quizzes_completed": 0,
+                                   "quiz_attempts": 0, "best_quiz_score": None,
+                                   "snippet_runs": 0, "successful_runs": 0}
+        for learner_id, kind, count in completions:
+            if learner_id in summary and kind in SUMMARY_KEYS:
+                summary[learner_id][SUMMARY_KEYS[kind]] = count
+        for learner_id, count, best in attempts:
+            if learner_id in summary:
+                summary[learner_id].update(quiz_attempts=count, best_quiz_score=best)
+        for learner_id, count, successful in runs:
+            if learner_id in summary:
+                summary[learner_id].update(snippet_runs=count, successful_runs=successful or 0)
+        return list(summary.values())
+
+    def module_completion_counts(self):
+        # Module name -> number of learners who completed it
+        with self._write_lock:
+            rows = self._connect().execute("SELECT name, COUNT(*) FROM completions WHERE kind = 'module' "
+                                           "GROUP BY name").fetchall()
+        return dict(rows)
+
+    def close(self):
+        # Also the exit hook of stores that were never closed; a closed store is released by atexit
+        atexit.unregister(self.close)
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+        with self._write_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def print_class_summary(store, report_file=None, stream=sys.stdout):
+    rows = store.class_summary()
+    print("%-24s %8s %8s %9s %10s %6s" % ("Learner", "Modules", "Quizzes", "Attempts", "Best quiz", "Runs"),
+          file=stream)
+    for row in rows:
+        best = "-" if row["best_quiz_score"] is None else "%.0f%%" % (row["best_quiz_score"] * 100)
+        print("%-24s %8d %8d %9d %10s %6d" % (row["learner"][:24], row["modules_completed"],
+                                              row["quizzes_completed"], row["quiz_attempts"], best,
+                                              row["snippet_runs"]), file=stream)
+    counts = store.module_completion_counts()
+    if counts:
+        print("", file=stream)
+        print("Completions per module (%d learners):" % len(rows), file=stream)
+        for name in sorted(counts, key=lambda name: (-counts[name], name)):
+            print("  %-30s %d" % (name, counts[name]), file=stream)
+    if report_file:
+        with open(report_file, "w") as f:
+            json.dump({"learners": rows, "module_completions": counts}, f, indent=4)
+    return rows
+
+# ---------------------------
+# Question Bank
+# ---------------------------
+
+QUIZ_LENGTH = 10
+QUIZ_PAGE_SIZE = 5
+DIFFICULTIES = ("easy", "medium", "hard")
+# Filter choices of the quiz page that mean "no filter"
+ALL_MODULES = "All modules"
+ANY_DIFFICULTY = "Any difficulty"
+# Stored in a selections array for questions the learner skipped
+UNANSWERED = 255
+
+class QuestionBank:
+    # Questions in load order, their correct options packed into one bytearray, and an index
+    # from (module, difficulty) to question positions so sampling never scans the whole bank
+
+    def __init__(self, questions=()):
+        self.questions = []
+        self.answers = bytearray()
+        self.positions = {}
+        self.by_tag = collections.defaultdict(list)
+        for question in questions:
+            self.add(question)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def add(self, question):
+        options = question.get("options")
+        answer = question.get("answer")
+        if not question.get("question") or not isinstance(options, list) or not 2 <= len(options) < UNANSWERED:
+            raise ValueError("a question needs text and between 2 and %d options" % (UNANSWERED - 1))
+        if not isinstance(answer, int) or not 0 <= answer < len(options):
+            raise ValueError("answer %r is not an option index" % (answer,))
+        question_id = str(question.get("id") or "q%d" % len(self.questions))
+        if question_id in self.positions:
+            raise ValueError("duplicate question id %r" % question_id)
+        difficulty = question.get("difficulty", "medium")
+        if difficulty not in DIFFICULTIES:
+            raise ValueError("difficulty must be one of %s" % ", ".join(DIFFICULTIES))
+
+        position = len(self.questions)
+        self.questions.append(dict(question, id=question_id, difficulty=difficulty))
+        self.answers.append(answer)
+        self.positions[question_id] = position
+        self.by_tag[(question.get("module"), difficulty)].append(position)
+        return position
+
+    def load_jsonl(self, path):
+        # One question object per line, the same keys as the built-in `quizzes`
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    self.add(json.loads(line))
+                except ValueError as exc:
+                    raise ValueError("%s:%d: %s" % (path, line_number, exc))
+        return self
+
+    def select(self, module=None, difficulty=None):
+        positions = []
+        for (tag_module, tag_difficulty), tagged in self.by_tag.items():
+            if module is not None and tag_module != module:
+                continue
+            if difficulty is not None and tag_difficulty != difficulty:
+                continue
+            positions.extend(tagged)
+        return positions
+
+    def sample(self, count, module=None, difficulty=None, rng=None):
+        # A random subset of matching questions in random order
+        import random
+        pool = self.select(module, difficulty)
+        return (rng or random).sample(pool, min(count, len(pool)))
+
+    def modules(self):
+        return sorted({module for module, _ in self.by_tag if module})
+
+    def answer_key(self, positions):
+        return bytes(self.answers[position] for position in positions)
+
+
+def score_answers(answer_key, selections):
+    # Both sides are byte strings of option indexes, so this is one C-level pass
+    return sum(map(operator.eq, answer_key, selections))
+
+
+def load_question_bank(files=()):
+    bank = QuestionBank(quizzes)
+    for path in files:
+        bank.load_jsonl(path)
+    return bank
+
+
+class QuizSession:
+    # One sampled quiz: the question positions, the learner's choices and the current page
+
+    def __init__(self, bank, positions):
+        self.bank = bank
+        self.positions = positions
+        self.answer_key = bank.answer_key(positions)
+        self.selections = bytearray([UNANSWERED]) * len(positions)
+        self.page = 0
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self.positions) // QUIZ_PAGE_SIZE))
+
+    def page_range(self):
+        start = self.page * QUIZ_PAGE_SIZE
+        return range(start, min(start + QUIZ_PAGE_SIZE, len(self.positions)))
+
+    def question(self, number):
+        return self.bank.questions[self.positions[number]]
+
+    def select(self, number, option):
+        self.selections[number] = option
+
+    @property
+    def answered(self):
+        return len(self.selections) - self.selections.count(UNANSWERED)
+
+    def score(self):
+        return score_answers(self.answer_key, self.selections)
+
+# ---------------------------
+# Batch Quiz Grading
+# ---------------------------
+
+GRADE_BATCH_LINES = 5000
+
+# Question bank of a grading worker process, loaded once by init_grader
+_grader_bank = None
+
+def init_grader(question_files):
+    global _grader_bank
+    _grader_bank = load_question_bank(question_files)
+
+
+def grade_batch(first_line, lines):
+    # Score a batch of JSONL submissions. Each one has "answers" (option indexes, null or -1 when
+    # skipped) and optionally "questions" (bank ids); without ids the answers follow bank order.
+    bank = _grader_bank
+    results = []
+    keys = []
+    selections = []
+    for line_number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            submission = json.loads(line)
+            answers = submission["answers"]
+            if "questions" in submission:
+                positions = [bank.positions[str(question_id)] for question_id in submission["questions"]]
+            else:
+                positions = range(min(len(answers), len(bank)))
+            if len(positions) != len(answers):
+                raise ValueError("%d answers for %d questions" % (len(answers), len(positions)))
+            selected = bytes(UNANSWERED if answer is None or not 0 <= answer < UNANSWERED else answer
+                             for answer in answers)
+        except KeyError as exc:
+            results.append({"line": line_number, "error": "unknown key or question id %s" % exc})
+            continue
+        except (ValueError, TypeError) as exc:
+            results.append({"line": line_number, "error": str(exc)})
+            continue
+        keys.append(bank.answer_key(positions))
+        selections.append(selected)
+        results.append({"learner": submission.get("learner"), "score": None, "total": len(positions),
+                        "answered": len(selected) - selected.count(UNANSWERED)})
+
+    # Every valid submission of the batch is scored in one concatenated byte comparison
+    scores = score_runs(b"".join(keys), b"".join(selections), [len(key) for key in keys])
+    remaining = iter(scores)
+    for result in results:
+        if "score" in result:
+            result["score"] = next(remaining)
+    return [json.dumps(result) for result in results], len(scores), sum(scores)
+
+
+def score_runs(answer_keys, selections, lengths):
+    matches = bytes(map(operator.eq, answer_keys, selections))
+    scores = []
+    offset = 0
+    for length in lengths:
+        scores.append(matches.count(1, offset, offset + length))
+        offset += length
+    return scores
+
+
+def grade_quizzes(submissions_file, question_files=(), output_file=None, workers=None,
+                  batch_lines=GRADE_BATCH_LINES, stream=sys.stderr):
+    # Stream submissions through a process pool a few batches at a time and write the results
+    # in input order as soon as the oldest batch is done, so memory stays bounded
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or available_cores()
+    started = time.perf_counter()
+    graded = errors = total_score = 0
+
+    source = sys.stdin if submissions_file == "-" else open(submissions_file, "r", encoding="utf-8")
+    output = sys.stdout if output_file in (None, "-") else open(output_file, "w", encoding="utf-8")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_grader,
+                                 initargs=(list(question_files),)) as executor:
+            pending = collections.deque()
+
+            def write_oldest():
+                nonlocal graded, errors, total_score
+                lines, batch_graded, batch_score = pending.popleft().result()
+                output.write("\n".join(lines) + "\n" if lines else "")
+                graded += batch_graded
+                errors += len(lines) - batch_graded
+                total_score += batch_score
+
+            first_line = 1
+            while True:
+                lines = list(itertools.islice(source, batch_lines))
+                if not lines:
+                    break
+                pending.append(executor.submit(grade_batch, first_line, lines))
+                first_line += len(lines)
+                if len(pending) >= workers * 2:
+                    write_oldest()
+            while pending:
+                write_oldest()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    mean = total_score / graded if graded else 0.0
+    print("Graded %d submissions (%d rejected) in %.1f s, mean score %.2f" % (graded, errors, elapsed, mean),
+          file=stream)
+    return graded, errors
+
+# ---------------------------
+# Compile Workspace Pool
+# ---------------------------
+
+DEFAULT_TARGET_FRAMEWORK = "net6.0"
+
+CSPROJ_TEMPLATE = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <OutputType>Exe</OutputType>
+    <TargetFramework>{target_framework}</TargetFramework>
+    <ImplicitUsings>enable</ImplicitUsings>
+    <Nullable>enable</Nullable>
+  </PropertyGroup>
+</Project>
+"""
+
+# Program compiled into a fresh workspace so its restore/obj/bin state exists before the first real snippet
+WARMUP_SOURCE = 'Console.WriteLine("warm");\n'
+
+# Keep MSBuild worker nodes and the Roslyn compiler server alive between builds
+DOTNET_BUILD_FLAGS = ["-c", "Release", "-nologo", "-nodeReuse:true", "-p:UseSharedCompilation=true"]
+DOTNET_BUILD_ENV = {
+    "DOTNET_CLI_USE_MSBUILD_SERVER": "1",
+    "DOTNET_NOLOGO": "1",
+    "DOTNET_CLI_TELEMETRY_OPTOUT": "1",
+    "DOTNET_SKIP_FIRST_TIME_EXPERIENCE": "1",
+}
+
+
+def dotnet_env():
+    env = os.environ.copy()
+    env.update(DOTNET_BUILD_ENV)
+    return env
+
+
+class CompileWorkspace:
+    # A project directory that survives between runs so `dotnet build` only recompiles Program.cs
+
+    def __init__(self, root, target_framework=DEFAULT_TARGET_FRAMEWORK):
+        self.root = root
+        self.target_framework = target_framework
+        self.csproj_file = os.path.join(root, "Program.csproj")
+        self.cs_file = os.path.join(root, "Program.cs")
+        self.out_dir = os.path.join(root, "out")
+        self.exe_file = os.path.join(self.out_dir, "Program.dll")
+        self.restored = False
+
+        os.makedirs(root, exist_ok=True)
+        with open(self.csproj_file, "w", encoding="utf-8") as f:
+            f.write(CSPROJ_TEMPLATE.format(target_framework=target_framework))
+
+    def prepare(self):
+        # Restore and build once so obj/ and bin/ exist before a snippet is compiled here
+        self.write_source(WARMUP_SOURCE)
+        return self.build()
+
+    def write_source(self, code):
+        with open(self.cs_file, "w", encoding="utf-8") as f:
+            f.write(code)
+
+    def build_command(self):
+        args = ["dotnet", "build", self.csproj_file, *DOTNET_BUILD_FLAGS, "-o", self.out_dir]
+        if self.restored:
+            args.append("--no-restore")
+        return args
+
+    def build(self, job=None, timeout=None):
+        # Output is streamed into the job when one is given, otherwise discarded
+        import subprocess
+        if job is not None:
+            returncode = job.run_process(self.build_command(), env=dotnet_env(), timeout=timeout)
+        else:
+            try:
+                returncode = subprocess.run(self.build_command(), stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL, env=dotnet_env(), timeout=timeout).returncode
+            except subprocess.TimeoutExpired:
+                returncode = -1
+        if returncode == 0:
+            self.restored = True
+        return returncode
+
+
+class WorkspacePool:
+    # Hands out warm CompileWorkspaces; released workspaces are kept for the next run
+
+    def __init__(self, target_framework=DEFAULT_TARGET_FRAMEWORK, max_idle=2):
+        self.target_framework = target_framework
+        self.max_idle = max_idle
+        # Created on first use so startup does not touch the filesystem
+        self.root = None
+        self._idle = []
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _create(self):
+        import tempfile
+        with self._lock:
+            if self.root is None:
+                self.root = tempfile.mkdtemp(prefix="csharp_trainer_")
+        path = os.path.join(self.root, "ws%d" % next(self._counter))
+        return CompileWorkspace(path, self.target_framework)
+
+    def acquire(self):
+        import shutil
+        with self._lock:
+            while self._idle:
+                workspace = self._idle.pop()
+                if workspace.target_framework == self.target_framework:
+                    return workspace
+                shutil.rmtree(workspace.root, ignore_errors=True)
+        # Nothing warm is available; the first build in this workspace will restore
+        return self._create()
+
+    def release(self, workspace):
+        import shutil
+        with self._lock:
+            if not self._closed and workspace.restored and len(self._idle) < self.max_idle:
+                self._idle.append(workspace)
+                return
+        shutil.rmtree(workspace.root, ignore_errors=True)
+
+    def prewarm(self, count):
+        # Prepare workspaces one after another on a background thread
+        self.max_idle = max(self.max_idle, count)
+
+        def worker():
+            for _ in range(count):
+                if self._closed:
+                    return
+                workspace = self._create()
+                workspace.prepare()
+                self.release(workspace)
+
+        thread = threading.Thread(target=worker, name="workspace-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        import shutil
+        with self._lock:
+            self._closed = True
+            self._idle = []
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+# ---------------------------
+# Toolchain Registry
+# ---------------------------
+
+TOOLCHAIN_CACHE_FILE = os.path.join(APP_DATA_DIR, "toolchain.json")
+
+# Backends in order of preference: dotnet builds incrementally in warm workspaces, csc compiles from scratch
+BACKEND_PREFERENCE = ("dotnet", "csc")
+
+RUNTIME_LINE_RE = re.compile(r"^Microsoft\.NETCore\.App (\d+)\.(\d+)\.\S+")
+SDK_LINE_RE = re.compile(r"^(\d+)\.(\d+)\.\S+")
+
+
+def framework_moniker(major, minor):
+    return "net%d.%d" % (major, minor) if major >= 5 else "netcoreapp%d.%d" % (major, minor)
+
+
+class ToolchainRegistry:
+    # Compilers, versions and installed runtimes, probed once and persisted between sessions
+
+    def __init__(self, cache_file=TOOLCHAIN_CACHE_FILE):
+        self.cache_file = cache_file
+        self.info = {"backends": {}, "target_framework": DEFAULT_TARGET_FRAMEWORK}
+        self._ready = threading.Event()
+
+    def probe_in_background(self, on_ready=None):
+        def worker():
+            # Waiters are released only after on_ready has applied the results
+            try:
+                self._load()
+                if on_ready is not None:
+                    on_ready(self)
+            finally:
+                self._ready.set()
+
+        thread = threading.Thread(target=worker, name="toolchain-probe", daemon=True)
+        thread.start()
+        return thread
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def backend(self):
+        for name in BACKEND_PREFERENCE:
+            if name in self.info["backends"]:
+                return name
+        return None
+
+    @property
+    def target_framework(self):
+        return self.info["target_framework"]
+
+    def version(self, name):
+        return self.info["backends"].get(name, {}).get("version", "")
+
+    def load(self):
+        self._load()
+        self._ready.set()
+        return self.info
+
+    def _load(self):
+        # Reuse the persisted probe unless PATH or one of the binaries changed since
+        fingerprint = self._fingerprint()
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                self.info = cached
+                return
+        except (OSError, ValueError):
+            pass
+
+        self.info = self._probe(fingerprint)
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(self.info, f, indent=4)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
+
+    def _fingerprint(self):
+        import shutil
+        binaries = {}
+        for name in BACKEND_PREFERENCE:
+            path = shutil.which(name)
+            if path is None:
+                continue
+            stamps = [path]
+            # Installing an SDK or runtime touches these directories without changing the dotnet binary
+            install_dir = os.path.dirname(os.path.realpath(path))
+            for candidate in (path, os.path.join(install_dir, "sdk"), os.path.join(install_dir, "shared", "Microsoft.NETCore.App")):
+                try:
+                    stamps.append(os.stat(candidate).st_mtime_ns)
+                except OSError:
+                    stamps.append(None)
+            binaries[name] = stamps
+        return {"PATH": os.environ.get("PATH", ""), "binaries": binaries}
+
+    def _probe(self, fingerprint):
+        backends = {}
+        target_framework = DEFAULT_TARGET_FRAMEWORK
+
+        if "dotnet" in fingerprint["binaries"]:
+            sdks = self._run(["dotnet", "--list-sdks"]).splitlines()
+            runtimes = self._run(["dotnet", "--list-runtimes"]).splitlines()
+            sdk_versions = [(int(m.group(1)), int(m.group(2))) for m in map(SDK_LINE_RE.match, sdks) if m]
+            runtime_versions = sorted({(int(m.group(1)), int(m.group(2))) for m in map(RUNTIME_LINE_RE.match, runtimes) if m})
+            # A runtime is a usable target only if an installed SDK can build for it
+            frameworks = [framework_moniker(*v) for v in runtime_versions if sdk_versions and v <= max(sdk_versions)]
+            if sdk_versions:
+                backends["dotnet"] = {
+                    "path": fingerprint["binaries"]["dotnet"][0],
+                    "version": self._run(["dotnet", "--version"]).strip(),
+                    "sdks": [line.strip() for line in sdks if line.strip()],
+                    "runtimes": [line.strip() for line in runtimes if line.strip()],
+                    "target_frameworks": frameworks,
+                }
+                if frameworks:
+                    target_framework = frameworks[-1]
+
+        if "csc" in fingerprint["binaries"]:
+            backends["csc"] = {
+                "path": fingerprint["binaries"]["csc"][0],
+                "version": self._run(["csc", "-version"]).strip(),
+            }
+
+        return {"fingerprint": fingerprint, "backends": backends, "target_framework": target_framework,
+                "probed_at": time.time()}
+
+    def _run(self, args):
+        import subprocess
+        try:
+            return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                  env=dotnet_env(), timeout=60).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return ""
+
+
+# ---------------------------
+# Build Artifact Cache
+# ---------------------------
+
+BUILD_CACHE_DIR = os.path.join(APP_DATA_DIR, "build_cache")
+DEFAULT_BUILD_CACHE_MB = 256
+
+
+class BuildCache:
+    # Compiled snippets stored on disk under a hash of everything that affects the build
+
+    def __init__(self, root=BUILD_CACHE_DIR, max_bytes=DEFAULT_BUILD_CACHE_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        # Set when lookups changed recency or counters; written with the next store, clear or close
+        self._dirty = False
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.entries = data.get("entries", {})
+        self.hits = data.get("hits", 0)
+        self.misses = data.get("misses", 0)
+        self.evictions = data.get("evictions", 0)
+
+    def _save_index(self):
+        data = {"entries": self.entries, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.index_file)
+        self._dirty = False
+
+    def key(self, code, compiler, compiler_version, target_framework):
+        digest = hashlib.sha256()
+        for part in (compiler, compiler_version, target_framework, CSPROJ_TEMPLATE, code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        # Path of the cached entry assembly, or None on a miss. Only the in-memory index is
+        # updated here, so a hit does not write to disk.
+        with self._lock:
+            entry = self.entries.get(key)
+            assembly = os.path.join(self.root, key, entry["assembly"]) if entry else None
+            if assembly is not None and os.path.exists(assembly):
+                entry["last_used"] = time.time()
+                self.hits += 1
+            else:
+                self.entries.pop(key, None)
+                assembly = None
+                self.misses += 1
+            self._dirty = True
+            return assembly
+
+    def store(self, key, output_dir, assembly_name):
+        # Copy a successful build's output into the cache and return the cached assembly path,
+        # or None when the build alone is larger than the cache
+        import shutil
+        import tempfile
+        target = os.path.join(self.root, key)
+        staging = tempfile.mkdtemp(prefix=key[:16] + ".", dir=self.root)
+        shutil.copytree(output_dir, staging, dirs_exist_ok=True)
+        size = sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(staging) for name in names)
+        if size > self.max_bytes:
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+
+        assembly = os.path.join(target, assembly_name)
+        with self._lock:
+            if not os.path.exists(assembly):
+                # Leftover directory without an assembly, e.g. from an interrupted store
+                shutil.rmtree(target, ignore_errors=True)
+            try:
+                os.replace(staging, target)
+            except OSError:
+                # Another writer produced the same entry first
+                shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(assembly):
+                # The build output did not contain the assembly; nothing worth indexing
+                shutil.rmtree(target, ignore_errors=True)
+                return None
+            self.entries[key] = {"assembly": assembly_name, "size": size, "last_used": time.time()}
+            self._evict(keep=key)
+            self._save_index()
+        return assembly
+
+    def _evict(self, keep=None):
+        # Drop least recently used entries until the cache fits under max_bytes
+        import shutil
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries.pop(key)["size"]
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            self.evictions += 1
+
+    def clear(self):
+        import shutil
+        with self._lock:
+            for key in list(self.entries):
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            self.entries = {}
+            self._save_index()
+
+    def close(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "size_bytes": sum(entry["size"] for entry in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# ---------------------------
+# Streaming Execution
+# ---------------------------
+
+# Chunks held between the pipe readers and the console; the oldest are dropped when the UI falls behind
+OUTPUT_BUFFER_CHUNKS = 1024
+OUTPUT_CHUNK_SIZE = 4096
+
+CONSOLE_MAX_LINES = 2000
+CONSOLE_MAX_CHARS = 500000
+CONSOLE_POLL_MS = 50
+# Upper bound on chunks inserted per poll so a flood of output cannot stall the event loop
+CONSOLE_CHUNKS_PER_POLL = 64
+
+JOB_STATUS_TEXT = {
+    "queued": "Queued",
+    "writing": "Writing source...",
+    "building": "Building...",
+    "running": "Running...",
+    "finished": "Finished",
+    "failed": "Failed",
+    "cancelled": "Cancelled",
+    "timeout": "Timed out",
+    "built": "Compiled",
+}
+# "built" ends a build-only job: the snippet was compiled (and cached) but not run
+JOB_DONE_STATES = ("finished", "failed", "cancelled", "timeout", "built")
+
+
+def kill_process_tree(proc):
+    # Children are started in their own process group/session so the whole tree can be killed
+    import signal
+    import subprocess
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ExecutionLimits:
+    # Wall-clock timeout per phase plus CPU/memory/file-size caps for the snippet process
+
+    def __init__(self, build_timeout=120, run_timeout=10, cpu_seconds=10, memory_mb=512, max_file_mb=64):
+        self.build_timeout = build_timeout
+        self.run_timeout = run_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_file_mb = max_file_mb
+
+    def run_command(self, args, compiler):
+        # The rlimits are set by a shell that then execs the program, so they are in place before it
+        # starts. A preexec_fn would run Python in a child forked from this multi-threaded process,
+        # which can deadlock. The build phase is left alone because reused MSBuild nodes would inherit them.
+        if os.name == "nt":
+            # No rlimits on Windows
+            return list(args)
+        limits = [
+            # Soft limit first: a hard limit below the current soft one would be rejected
+            "ulimit -S -t %d" % self.cpu_seconds,
+            "ulimit -H -t %d" % (self.cpu_seconds + 1),
+            # In 512-byte blocks
+            "ulimit -f %d" % (self.max_file_mb * 2048),
+        ]
+        if compiler != "dotnet":
+            # CoreCLR reserves far more address space than it uses, so RLIMIT_AS only applies to other runtimes
+            limits.append("ulimit -v %d" % (self.memory_mb * 1024))
+        return ["/bin/sh", "-c", " && ".join(limits) + ' && exec "$@"', "sh"] + list(args)
+
+    def run_env(self, compiler):
+        if compiler != "dotnet":
+            return None
+        env = dotnet_env()
+        env["DOTNET_GCHeapHardLimit"] = "%x" % (self.memory_mb * 1024 * 1024)
+        # W^X double mapping sizes a memfd far past RLIMIT_FSIZE; turning it off also shortens startup
+        env["DOTNET_EnableWriteXorExecute"] = "0"
+        return env
+
+
+class ExecutionJob:
+    # One compile-and-run request; worker threads write into it and the UI polls it
+
+    def __init__(self, code, key=None, priority=0, build_only=False):
+        self.code = code
+        self.key = key
+        self.priority = priority
+        self.build_only = build_only
+        self.state = "queued"
+        self.started = False
+        self.timed_out = False
+        # Set once the snippet compiled (or came from the build cache), whatever happens afterwards
+        self.compiled = False
+        self.returncode = None
+        self.submitted = time.perf_counter()
+        self.output = collections.deque(maxlen=OUTPUT_BUFFER_CHUNKS)
+        self.dropped = 0
+        self._cancelled = threading.Event()
+        self._proc = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self.state in JOB_DONE_STATES
+
+    def cancel(self):
+        self._cancelled.set()
+        if not self.started:
+            self.state = "cancelled"
+        with self._lock:
+            proc = self._proc
+        if proc is not None:
+            kill_process_tree(proc)
+
+    def finish_build(self):
+        # Called once the snippet is compiled; True when this is a build-only job, which ends here
+        with self._lock:
+            self.compiled = True
+            if self.build_only:
+                self.state = "built"
+            return self.build_only
+
+    def upgrade(self):
+        # Turn a build-only job into a normal run; False when its build has already finished
+        with self._lock:
+            if self.state == "built":
+                return False
+            self.build_only = False
+            return True
+
+    def attach_process(self, proc):
+        # A process run outside run_process (the execution host) that cancel() should kill
+        with self._lock:
+            self._proc = proc
+        if self.cancelled:
+            kill_process_tree(proc)
+
+    def detach_process(self):
+        with self._lock:
+            self._proc = None
+
+    def write(self, stream, text):
+        if len(self.output) == self.output.maxlen:
+            self.dropped += 1
+        self.output.append((stream, text))
+
+    def run_process(self, args, env=None, timeout=None, input_data=None, cwd=None):
+        import subprocess
+        if self.cancelled:
+            return -1
+
+        if os.name == "nt":
+            group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group_kwargs = {"start_new_session": True}
+        proc = subprocess.Popen(args, stdin=subprocess.DEVNULL if input_data is None else subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, cwd=cwd,
+                                **group_kwargs)
+        with self._lock:
+            self._proc = proc
+        if self.cancelled:
+            kill_process_tree(proc)
+
+        readers = [
+            threading.Thread(target=self._pump, args=(proc.stdout, "stdout"), daemon=True),
+            threading.Thread(target=self._pump, args=(proc.stderr, "stderr"), daemon=True),
+        ]
+        if input_data is not None:
+            readers.append(threading.Thread(target=self._feed, args=(proc.stdin, input_data), daemon=True))
+        for reader in readers:
+            reader.start()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(proc)
+            proc.wait()
+            self.timed_out = True
+            self.write("info", "\nTimed out after %s seconds.\n" % timeout)
+        # A detached grandchild may still hold the pipes open; don't wait on it forever
+        for reader in readers:
+            reader.join(timeout=1.0)
+
+        with self._lock:
+            self._proc = None
+        return proc.returncode
+
+    def _feed(self, pipe, data):
+        # The program may exit (or be killed) before reading all of its input
+        try:
+            with pipe:
+                pipe.write(data)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def stdout_text(self):
+        return "".join(text for stream, text in self.output if stream == "stdout")
+
+    def _pump(self, pipe, stream):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with pipe:
+            while True:
+                chunk = pipe.read1(OUTPUT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.write(stream, decoder.decode(chunk))
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                self.write(stream, tail)
+
+
+def run_snippet(job, pool, toolchain, cache=None, limits=None, host=None):
+    # Worker-thread body for one execution: write, build (unless cached), run
+    import tempfile
+    limits = limits or ExecutionLimits()
+
+    def run_dotnet(assembly):
+        # Through the persistent host when there is one, otherwise a `dotnet` process per run
+        returncode = None
+        if host is not None:
+            with tracer.span("execute.run_host"):
+                returncode = host.run(job, assembly, limits.run_timeout)
+        if returncode is None:
+            with tracer.span("execute.run", backend="dotnet"):
+                returncode = job.run_process(limits.run_command(["dotnet", assembly], "dotnet"),
+                                             env=limits.run_env("dotnet"), timeout=limits.run_timeout)
+        return returncode
+
+    def finish_failed_build():
+        if job.cancelled:
+            job.state = "cancelled"
+        elif job.timed_out:
+            job.state = "timeout"
+        else:
+            job.state = "failed"
+            job.write("info", "\nCompilation failed.\n")
+
+    try:
+        if job.cancelled:
+            job.state = "cancelled"
+            return
+        with tracer.span("execute.toolchain_wait"):
+            toolchain.wait()
+        compiler = toolchain.backend
+        if compiler is None:
+            job.write("info", "No C# compiler found. Please install the .NET SDK or csc.\n")
+            job.state = "failed"
+            return
+
+        key = None
+        with tracer.span("execute.cache_lookup"):
+            if cache is not None:
+                key = cache.key(job.code, compiler, toolchain.version(compiler), pool.target_framework)
+            assembly = cache.lookup(key) if key is not None else None
+        if assembly is not None:
+            if job.finish_build():
+                return
+            job.write("info", "Using cached build.\n")
+        elif compiler == "dotnet":
+            job.state = "writing"
+            workspace = None
+            try:
+                with tracer.span("execute.setup", backend=compiler):
+                    workspace = pool.acquire()
+                    workspace.write_source(job.code)
+                job.state = "building"
+                with tracer.span("execute.build", backend=compiler):
+                    built = workspace.build(job, timeout=limits.build_timeout)
+                if built != 0:
+                    finish_failed_build()
+                    return
+                if cache is not None:
+                    with tracer.span("execute.cache_store"):
+                        assembly = cache.store(key, workspace.out_dir, "Program.dll")
+                if job.finish_build():
+                    return
+                if assembly is None:
+                    # Not cacheable, so run it before the workspace is handed to someone else
+                    job.state = "running"
+                    returncode = run_dotnet(workspace.exe_file)
+            finally:
+                if workspace is not None:
+                    pool.release(workspace)
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                with tracer.span("execute.setup", backend=compiler):
+                    cs_file = os.path.join(temp_dir, "Program.cs")
+                    out_dir = os.path.join(temp_dir, "out")
+                    exe_file = os.path.join(out_dir, "Program.exe")
+                    os.makedirs(out_dir)
+
+                    job.state = "writing"
+                    with open(cs_file, "w", encoding="utf-8") as f:
+                        f.write(job.code)
+
+                job.state = "building"
+                with tracer.span("execute.build", backend=compiler):
+                    built = job.run_process(["csc", "/nologo", "/out:" + exe_file, cs_file], timeout=limits.build_timeout)
+                if built != 0:
+                    finish_failed_build()
+                    return
+                if cache is not None:
+                    with tracer.span("execute.cache_store"):
+                        assembly = cache.store(key, out_dir, "Program.exe")
+                if job.finish_build():
+                    return
+                if assembly is None:
+                    job.state = "running"
+                    with tracer.span("execute.run", backend=compiler):
+                        returncode = job.run_process(limits.run_command([exe_file], compiler),
+                                                     timeout=limits.run_timeout)
+
+        if assembly is not None:
+            job.state = "running"
+            if compiler == "dotnet":
+                returncode = run_dotnet(assembly)
+            else:
+                with tracer.span("execute.run", backend=compiler, cached=True):
+                    returncode = job.run_process(limits.run_command([assembly], compiler),
+                                                 timeout=limits.run_timeout)
+
+        job.returncode = returncode
+        if job.cancelled:
+            job.state = "cancelled"
+        elif job.timed_out:
+            job.state = "timeout"
+        else:
+            job.write("info", "\n[Process exited with code %d]\n" % returncode)
+            job.state = "finished" if returncode == 0 else "failed"
+    except Exception as exc:
+        job.write("info", "\nExecution error: %s\n" % exc)
+        job.state = "failed"
+
+
+# ---------------------------
+# Execution Host
+# ---------------------------
+
+EXECUTION_HOST_DIR = os.path.join(APP_DATA_DIR, "execution_host")
+# Captured output per run is cut off past this many characters
+HOST_OUTPUT_LIMIT = 1000000
+HOST_START_TIMEOUT = 60
+
+# Long-lived runner: one JSON request per line on stdin, one JSON response per line on stdout.
+# Each snippet assembly is loaded into its own collectible AssemblyLoadContext and unloaded afterwards.
+HOST_SOURCE = r"""
+using System.Reflection;
+using System.Runtime.Loader;
+using System.Text;
+using System.Text.Json;
+
+var protocolOut = new StreamWriter(Console.OpenStandardOutput(), new UTF8Encoding(false)) { AutoFlush = true };
+var protocolIn = new StreamReader(Console.OpenStandardInput(), new UTF8Encoding(false));
+var originalOut = Console.Out;
+var originalError = Console.Error;
+var outputLimit = int.Parse(args.Length > 0 ? args[0] : "1000000");
+protocolOut.WriteLine(JsonSerializer.Serialize(new { ready = true }));
+
+string? line;
+while ((line = protocolIn.ReadLine()) != null)
+{
+    using var request = JsonDocument.Parse(line);
+    var id = request.RootElement.GetProperty("id").GetInt64();
+    var path = request.RootElement.GetProperty("assembly").GetString()!;
+    var stdout = new CappedWriter(outputLimit);
+    var stderr = new CappedWriter(outputLimit);
+    var exitCode = 0;
+    RunSnippet(path, id, stdout, stderr, ref exitCode);
+    Console.SetOut(originalOut);
+    Console.SetError(originalError);
+    protocolOut.WriteLine(JsonSerializer.Serialize(new
+    {
+        id,
+        exit = exitCode,
+        stdout = stdout.ToString(),
+        stderr = stderr.ToString(),
+        truncated = stdout.Truncated || stderr.Truncated,
+    }));
+    // Let the unloaded context actually go away before the next snippet
+    GC.Collect();
+    GC.WaitForPendingFinalizers();
+}
+
+static void RunSnippet(string path, long id, CappedWriter stdout, CappedWriter stderr, ref int exitCode)
+{
+    var context = new AssemblyLoadContext("snippet" + id, isCollectible: true);
+    try
+    {
+        Assembly assembly;
+        using (var stream = File.OpenRead(path))
+        {
+            assembly = context.LoadFromStream(stream);
+        }
+        var entry = assembly.EntryPoint ?? throw new InvalidOperationException("The assembly has no entry point.");
+        Console.SetOut(stdout);
+        Console.SetError(stderr);
+        Console.SetIn(TextReader.Null);
+        Environment.ExitCode = 0;
+        var result = entry.Invoke(null, entry.GetParameters().Length == 0 ? null : new object[] { Array.Empty<string>() });
+        Console.Out.Flush();
+        exitCode = result is int code ? code : Environment.ExitCode;
+    }
+    catch (TargetInvocationException ex) when (ex.InnerException != null)
+    {
+        stderr.WriteLine("Unhandled exception. " + ex.InnerException);
+        exitCode = 1;
+    }
+    catch (Exception ex)
+    {
+        stderr.WriteLine("Execution host error: " + ex.Message);
+        exitCode = 1;
+    }
+    finally
+    {
+        context.Unload();
+    }
+}
+
+class CappedWriter : StringWriter
+{
+    private readonly int limit;
+    public bool Truncated { get; private set; }
+
+    public CappedWriter(int limit) { this.limit = limit; }
+
+    private int Room(int wanted)
+    {
+        var room = Math.Max(0, limit - GetStringBuilder().Length);
+        if (wanted > room) Truncated = true;
+        return Math.Min(room, wanted);
+    }
+
+    public override void Write(char value) { if (Room(1) == 1) base.Write(value); }
+    public override void Write(string? value) { if (value != null) base.Write(value.Substring(0, Room(value.Length))); }
+    public override void Write(char[] buffer, int index, int count) { base.Write(buffer, index, Room(count)); }
+}
+"""
+
+
+class DotnetHost:
+    # Keeps one `dotnet` process alive to run compiled snippets without paying runtime startup per run.
+    # A crash, hang or cancel kills the process; the next run starts a fresh one.
+
+    def __init__(self, target_framework=DEFAULT_TARGET_FRAMEWORK, root=EXECUTION_HOST_DIR, limits=None):
+        self.target_framework = target_framework
+        self.root = root
+        self.limits = limits or ExecutionLimits()
+        self.disabled = False
+        self._proc = None
+        self._responses = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _assembly(self):
+        # Built once per host source and target framework; later sessions reuse the output
+        import subprocess
+        stamp = hashlib.sha256((HOST_SOURCE + self.target_framework).encode("utf-8")).hexdigest()[:16]
+        project_dir = os.path.join(self.root, stamp)
+        assembly = os.path.join(project_dir, "out", "ExecutionHost.dll")
+        if os.path.exists(assembly):
+            return assembly
+        os.makedirs(project_dir, exist_ok=True)
+        with open(os.path.join(project_dir, "ExecutionHost.csproj"), "w", encoding="utf-8") as f:
+            f.write(CSPROJ_TEMPLATE.format(target_framework=self.target_framework))
+        with open(os.path.join(project_dir, "Program.cs"), "w", encoding="utf-8") as f:
+            f.write(HOST_SOURCE)
+        with tracer.span("host.build"):
+            build = subprocess.run(["dotnet", "build", os.path.join(project_dir, "ExecutionHost.csproj"),
+                                    *DOTNET_BUILD_FLAGS, "-o", os.path.join(project_dir, "out")],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=dotnet_env(),
+                                   timeout=self.limits.build_timeout)
+        if build.returncode != 0 or not os.path.exists(assembly):
+            raise RuntimeError("could not build the execution host:\n" + build.stdout[-2000:])
+        return assembly
+
+    def start(self):
+        # Called with _lock held, or from a background thread before the first run
+        import subprocess
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        with tracer.span("host.start"):
+            assembly = self._assembly()
+            group_kwargs = ({"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt"
+                            else {"start_new_session": True})
+            proc = subprocess.Popen(["dotnet", assembly, str(HOST_OUTPUT_LIMIT)], stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=self.limits.run_env("dotnet"),
+                                    **group_kwargs)
+            responses = queue.Queue()
+            threading.Thread(target=self._read, args=(proc, responses), daemon=True).start()
+            try:
+                ready = responses.get(timeout=HOST_START_TIMEOUT)
+            except queue.Empty:
+                ready = None
+            if not ready or not ready.get("ready"):
+                kill_process_tree(proc)
+                raise RuntimeError("the execution host did not start")
+            self._proc = proc
+            self._responses = responses
+
+    def prestart(self):
+        import subprocess
+
+        def worker():
+            with self._lock:
+                try:
+                    self.start()
+                # SubprocessError: the host build ran past the build timeout
+                except (OSError, RuntimeError, ValueError, subprocess.SubprocessError) as exc:
+                    self.disabled = True
+                    print("Execution host unavailable, using a process per run: %s" % exc, file=sys.stderr)
+        threading.Thread(target=worker, name="execution-host-start", daemon=True).start()
+
+    def _read(self, proc, responses):
+        # Responses are single JSON lines; None marks the end of the process
+        for line in proc.stdout:
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                continue
+        responses.put(None)
+
+    def run(self, job, assembly, timeout):
+        # Returns the exit code, or None when the host is not usable and the caller should spawn a process
+        import subprocess
+        if self.disabled or not self._lock.acquire(blocking=False):
+            # Busy with another worker's snippet; a separate process is faster than queueing behind it
+            return None
+        try:
+            try:
+                self.start()
+            except (OSError, RuntimeError, ValueError, subprocess.SubprocessError) as exc:
+                self.disabled = True
+                job.write("info", "Execution host unavailable, using a process per run: %s\n" % exc)
+                return None
+            proc = self._proc
+            request_id = next(self._ids)
+            job.attach_process(proc)
+            try:
+                proc.stdin.write((json.dumps({"id": request_id, "assembly": os.path.abspath(assembly)}) + "\n")
+                                 .encode("utf-8"))
+                proc.stdin.flush()
+                response = self._responses.get(timeout=timeout)
+            except (OSError, ValueError):
+                response = None
+            except queue.Empty:
+                self._kill()
+                job.timed_out = True
+                job.write("info", "\nTimed out after %s seconds.\n" % timeout)
+                return -1
+            finally:
+                job.detach_process()
+
+            if response is None:
+                # Environment.Exit, a crash or a cancel took the host down with the snippet
+                returncode = proc.wait()
+                self._kill()
+                return returncode
+            if response.get("stdout"):
+                job.write("stdout", response["stdout"])
+            if response.get("stderr"):
+                job.write("stderr", response["stderr"])
+            if response.get("truncated"):
+                job.write("info", "\n[Output truncated]\n")
+            return response["exit"]
+        finally:
+            self._lock.release()
+
+    def _kill(self):
+        if self._proc is not None:
+            kill_process_tree(self._proc)
+            self._proc.wait()
+        self._proc = None
+        self._responses = None
+
+    def close(self):
+        proc = self._proc
+        if proc is not None:
+            kill_process_tree(proc)
+        self._proc = None
+
+
+# ---------------------------
+# Execution Scheduler
+# ---------------------------
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_BACKGROUND = 2
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def snippet_key(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class ExecutionScheduler:
+    # Priority queue in front of run_snippet with a fixed worker count and single-flight dedup
+
+    def __init__(self, pool, toolchain, cache=None, limits=None, workers=None, host=None):
+        self.pool = pool
+        self.toolchain = toolchain
+        self.cache = cache
+        self.host = host
+        self.limits = limits or ExecutionLimits()
+        self.workers = workers or available_cores()
+        # Speculative (build-only) jobs never occupy every worker, so an Execute click does not
+        # wait behind background builds; the ones over the limit wait in _deferred
+        self.speculative_limit = max(1, self.workers - 1)
+        self._speculative = 0
+        self._deferred = []
+        # Every worker may hold a workspace; keep them all warm instead of discarding the extras
+        pool.max_idle = max(pool.max_idle, self.workers)
+        self._queue = queue.PriorityQueue()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name="execute-%d" % index, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, code, priority=PRIORITY_INTERACTIVE, build_only=False):
+        # Identical code that is still queued or running shares the existing job; a run request
+        # for a snippet that is being precompiled takes over that job instead of building again
+        key = snippet_key(code)
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None and not job.cancelled and not job.done and (build_only or job.upgrade()):
+                if priority < job.priority:
+                    self._enqueue(job, priority)
+                return job
+            job = ExecutionJob(code, key=key, priority=priority, build_only=build_only)
+            self._inflight[key] = job
+            self._enqueue(job, priority)
+        return job
+
+    def _enqueue(self, job, priority):
+        # Raising a priority pushes a second entry; the stale one is skipped when it is popped
+        job.priority = priority
+        self._queue.put((priority, next(self._seq), job))
+
+    def _worker(self):
+        while True:
+            entry = self._queue.get()
+            priority, _, job = entry
+            if job is None:
+                return
+            with self._lock:
+                if job.started or priority != job.priority:
+                    continue
+                if job.cancelled:
+                    job.state = "cancelled"
+                    self._forget(job)
+                    continue
+                speculative = job.build_only
+                if speculative:
+                    if self._speculative >= self.speculative_limit:
+                        heapq.heappush(self._deferred, entry)
+                        continue
+                    self._speculative += 1
+                job.started = True
+            tracer.record("execute.queue_wait", job.submitted, time.perf_counter())
+            try:
+                with tracer.span("execute.total"):
+                    run_snippet(job, self.pool, self.toolchain, self.cache, self.limits, self.host)
+            finally:
+                with self._lock:
+                    self._forget(job)
+                    if speculative:
+                        self._speculative -= 1
+                        # Deferred jobs compete again; cancelled or upgraded ones are skipped when popped
+                        while self._deferred:
+                            self._queue.put(heapq.heappop(self._deferred))
+
+    def _forget(self, job):
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._inflight.values())
+        for job in jobs:
+            job.cancel()
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+
+
+class OutputConsole(ttk.Frame):
+    # Output pane that keeps only the most recent lines/characters
+
+    def __init__(self, master, max_lines=CONSOLE_MAX_LINES, max_chars=CONSOLE_MAX_CHARS, **kwargs):
+        super().__init__(master, **kwargs)
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self._chars = 0
+
+        self.text = scrolledtext.ScrolledText(self, wrap=tk.CHAR, height=10, font=("Consolas", 11),
+                                              bg="#1e1e1e", fg="#d4d4d4", insertbackground="#d4d4d4")
+        self.text.pack(fill='both', expand=True)
+        self.text.tag_configure("stderr", foreground="#f48771")
+        self.text.tag_configure("info", foreground="#569cd6")
+        self.text.configure(state='disabled')
+
+    def append(self, text, tag="stdout"):
+        self.text.configure(state='normal')
+        self.text.insert(tk.END, text, tag)
+        self._chars += len(text)
+
+        # Trim from the top once either bound is exceeded
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        if line_count > self.max_lines:
+            cut = "%d.0" % (line_count - self.max_lines + 1)
+            removed = self.text.count("1.0", cut, "chars")
+            self.text.delete("1.0", cut)
+            if removed:
+                self._chars -= removed[0]
+        if self._chars > self.max_chars:
+            excess = self._chars - self.max_chars
+            self.text.delete("1.0", "1.0 + %d chars" % excess)
+            self._chars -= excess
+
+        self.text.configure(state='disabled')
+        self.text.see(tk.END)
+
+    def clear(self):
+        self.text.configure(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.configure(state='disabled')
+        self._chars = 0
+
+
+# ---------------------------
+# Snippet Validation
+# ---------------------------
+
+SNIPPET_CSPROJ_TEMPLATE = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <OutputType>{output_type}</OutputType>
+    <TargetFramework>{target_framework}</TargetFramework>
+    <ImplicitUsings>enable</ImplicitUsings>
+    <Nullable>enable</Nullable>
+    <RootNamespace>{namespace}</RootNamespace>
+    <AssemblyName>{namespace}</AssemblyName>
+  </PropertyGroup>
+</Project>
+"""
+
+# Builds every snippet project in one MSBuild invocation; the projects are independent so -m can fan out
+TRAVERSAL_PROJECT = """<Project DefaultTargets="Build">
+  <ItemGroup>
+    <Snippet Include="*/Snippet.csproj" />
+  </ItemGroup>
+  <Target Name="Restore">
+    <MSBuild Projects="@(Snippet)" Targets="Restore" BuildInParallel="true" />
+  </Target>
+  <Target Name="Build">
+    <MSBuild Projects="@(Snippet)" Targets="Build" BuildInParallel="true" ContinueOnError="true" />
+  </Target>
+</Project>
+"""
+
+ENTRY_POINT_RE = re.compile(r"\bstatic\s+(?:async\s+)?[\w<>]+\s+Main\s*\(")
+TYPE_DECLARATION_RE = re.compile(
+    r"^(?:(?:public|internal|private|protected|static|abstract|sealed|partial|readonly|unsafe)\s+)*"
+    r"(?:class|struct|interface|enum|record|delegate|namespace)\b")
+MEMBER_DECLARATION_RE = re.compile(
+    r"^(?:public|internal|private|protected)\s+(?:(?:static|async|virtual|override|abstract)\s+)*"
+    r"[\w<>\[\],?]+\s+\w+\s*\(")
+MSBUILD_ERROR_RE = re.compile(r"^\s*(?P<location>.*?): error (?P<code>\w+): (?P<message>.*?) \[(?P<project>[^\]]+)\]\s*$")
+
+
+def wrap_snippet(code):
+    # Decide how a lesson fragment compiles on its own; returns (source, output type, kind)
+    lines = code.split('\n')
+    usings = [line for line in lines if line.strip().startswith("using ") and line.strip().endswith(";")
+              and "(" not in line]
+    body = [line for line in lines if line not in usings]
+    first = next((line.strip() for line in body if line.strip() and not line.strip().startswith("//")), "")
+
+    if ENTRY_POINT_RE.search(code):
+        return code, "Exe", "program"
+    if TYPE_DECLARATION_RE.match(first):
+        return code, "Library", "types"
+    if MEMBER_DECLARATION_RE.match(first):
+        # Bare methods are hosted in a class of their own
+        wrapped = "\n".join(usings + ["public class SnippetHost", "{"] + ["    " + line for line in body] + ["}"])
+        return wrapped + "\n", "Library", "members"
+    return code, "Exe", "statements"
+
+
+def write_snippet_project(root, namespace, sources, output_type, target_framework):
+    # sources: {file name: text}; the project directory name doubles as its namespace
+    project_dir = os.path.join(root, namespace)
+    os.makedirs(project_dir)
+    for name, source in sources.items():
+        with open(os.path.join(project_dir, name), "w", encoding="utf-8") as f:
+            f.write(source)
+    with open(os.path.join(project_dir, "Snippet.csproj"), "w", encoding="utf-8") as f:
+        f.write(SNIPPET_CSPROJ_TEMPLATE.format(output_type=output_type, target_framework=target_framework,
+                                               namespace=namespace))
+    return project_dir
+
+
+def build_project_batch(root, projects, timeout=None):
+    # Build every */Snippet.csproj under root in one parallel MSBuild run. Compiler errors are
+    # appended to projects[namespace]["errors"]; returns the finished process and unattributed lines.
+    import subprocess
+    traversal = os.path.join(root, "Build.proj")
+    with open(traversal, "w", encoding="utf-8") as f:
+        f.write(TRAVERSAL_PROJECT)
+
+    build = subprocess.run(["dotnet", "build", traversal, "-m", "-nologo", "-v:q", "-clp:ErrorsOnly",
+                            "-nodeReuse:true", "-p:UseSharedCompilation=true"],
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=dotnet_env(),
+                           timeout=timeout)
+
+    unattributed = []
+    for line in build.stdout.splitlines():
+        match = MSBUILD_ERROR_RE.match(line)
+        if match is None:
+            continue
+        namespace = os.path.basename(os.path.dirname(match.group("project")))
+        error = "%s: %s" % (match.group("code"), match.group("message"))
+        if namespace in projects:
+            if error not in projects[namespace]["errors"]:
+                projects[namespace]["errors"].append(error)
+        else:
+            unattributed.append(line.strip())
+    return build, unattributed
+
+
+def validate_snippets(modules, toolchain, report_file=None, stream=sys.stdout):
+    # Compile every lesson snippet as its own project in one parallel build and report pass/fail
+    import tempfile
+    if "dotnet" not in toolchain.info["backends"]:
+        print("Snippet validation needs the .NET SDK (dotnet) on PATH.", file=stream)
+        return 1
+    target_framework = toolchain.target_framework
+    snippets = list(iter_snippets(modules))
+    if not snippets:
+        print("No code snippets found.", file=stream)
+        return 0
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="csharp_validate_") as root:
+        projects = {}
+        for number, (module_name, heading, index, code) in enumerate(snippets, 1):
+            namespace = "Snippet%04d" % number
+            source, output_type, kind = wrap_snippet(code)
+            write_snippet_project(root, namespace, {"Program.cs": source}, output_type, target_framework)
+            projects[namespace] = {"module": module_name, "section": heading, "index": index,
+                                   "kind": kind, "errors": []}
+
+        build, unattributed = build_project_batch(root, projects)
+
+    elapsed = time.perf_counter() - started
+    results = list(projects.values())
+    failed = [result for result in results if result["errors"]]
+    for result in results:
+        result["passed"] = not result["errors"]
+        label = "%s / %s #%d (%s)" % (result["module"], result["section"], result["index"], result["kind"])
+        print("%s  %s" % ("PASS" if result["passed"] else "FAIL", label), file=stream)
+        for error in result["errors"]:
+            print("      " + error, file=stream)
+    for line in unattributed:
+        print("ERROR " + line, file=stream)
+    print("\n%d snippets, %d passed, %d failed in %.1fs" % (len(results), len(results) - len(failed), len(failed), elapsed),
+          file=stream)
+
+    if report_file:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_seconds": elapsed, "snippets": results, "unattributed_errors": unattributed}, f, indent=4)
+
+    if build.returncode != 0 and not failed and not unattributed:
+        print(build.stdout, file=stream)
+    return 1 if failed or unattributed or build.returncode != 0 else 0
+
+
+# ---------------------------
+# Exercise Grading
+# ---------------------------
+
+MATCH_MODES = ("exact", "whitespace", "regex")
+
+
+def find_submissions(submissions_dir):
+    # A submission is either Student.cs or a Student/ directory of .cs files; returns {student: {file: text}}
+    submissions = collections.OrderedDict()
+    for name in sorted(os.listdir(submissions_dir)):
+        path = os.path.join(submissions_dir, name)
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".cs")]
+            student = name
+        elif name.endswith(".cs"):
+            files = [path]
+            student = name[:-3]
+        else:
+            continue
+        if files:
+            sources = {}
+            for file in files:
+                with open(file, "r", encoding="utf-8", errors="replace") as f:
+                    sources[os.path.basename(file)] = f.read()
+            submissions[student] = sources
+    return submissions
+
+
+def find_fixtures(fixtures_dir, match):
+    # NAME.out is the expected stdout (compared with `match`), NAME.regex is always a regex,
+    # and an optional NAME.in is fed to stdin
+    fixtures = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext not in (".out", ".regex"):
+            continue
+        with open(os.path.join(fixtures_dir, name), "r", encoding="utf-8") as f:
+            expected = f.read()
+        input_file = os.path.join(fixtures_dir, stem + ".in")
+        input_data = None
+        if os.path.exists(input_file):
+            with open(input_file, "rb") as f:
+                input_data = f.read()
+        mode = "regex" if ext == ".regex" else match
+        pattern = re.compile(expected.strip(), re.DOTALL) if mode == "regex" else None
+        fixtures.append({"name": stem, "mode": mode, "expected": expected, "pattern": pattern,
+                         "input": input_data})
+    return fixtures
+
+
+def outputs_match(actual, fixture):
+    actual = actual.replace("\r\n", "\n")
+    mode = fixture["mode"]
+    if mode == "regex":
+        return fixture["pattern"].fullmatch(actual.strip()) is not None
+    expected = fixture["expected"].replace("\r\n", "\n")
+    if mode == "whitespace":
+        return actual.split() == expected.split()
+    return actual == expected
+
+
+def compile_submissions(root, submissions, toolchain, limits, workers):
+    # Returns {student: {"program": argv prefix or None, "errors": [...]}}
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    results = collections.OrderedDict()
+    if toolchain.backend == "dotnet":
+        # One MSBuild run builds every student project in parallel, like --validate-snippets
+        projects = {}
+        namespaces = {}
+        for number, (student, sources) in enumerate(submissions.items(), 1):
+            namespace = "Student%04d" % number
+            write_snippet_project(root, namespace, sources, "Exe", toolchain.target_framework)
+            projects[namespace] = {"errors": []}
+            namespaces[student] = namespace
+        # The build timeout is per project; MSBuild works through them `workers` at a time
+        timeout = limits.build_timeout * -(-len(projects) // workers)
+        try:
+            build, unattributed = build_project_batch(root, projects, timeout=timeout)
+        except (OSError, subprocess.SubprocessError) as exc:
+            unattributed = ["Build failed: %s" % exc]
+        for student, namespace in namespaces.items():
+            assembly = os.path.join(root, namespace, "bin", "Debug", toolchain.target_framework, namespace + ".dll")
+            errors = projects[namespace]["errors"]
+            if not errors and not os.path.exists(assembly):
+                errors = ["Build produced no assembly"] + unattributed[:3]
+            results[student] = {"program": None if errors else ["dotnet", assembly], "errors": errors}
+        return results
+
+    def compile_one(item):
+        number, (student, sources) = item
+        project_dir = os.path.join(root, "Student%04d" % number)
+        os.makedirs(project_dir)
+        files = []
+        for name, source in sources.items():
+            files.append(os.path.join(project_dir, name))
+            with open(files[-1], "w", encoding="utf-8") as f:
+                f.write(source)
+        exe_file = os.path.join(project_dir, "Program.exe")
+        job = ExecutionJob(None)
+        if job.run_process(["csc", "/nologo", "/out:" + exe_file] + files, timeout=limits.build_timeout) != 0:
+            log = "".join(text for _, text in job.output)
+            return student, {"program": None, "errors": [line.strip() for line in log.splitlines() if ": error" in line]
+                                                          or ["Compilation failed"]}
+        return student, {"program": [exe_file], "errors": []}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results.update(executor.map(compile_one, enumerate(submissions.items(), 1)))
+    return results
+
+
+def run_exercise_test(program, fixture, compiler, limits):
+    job = ExecutionJob(None)
+    started = time.perf_counter()
+    returncode = job.run_process(limits.run_command(program, compiler), env=limits.run_env(compiler),
+                                 timeout=limits.run_timeout, input_data=fixture["input"])
+    elapsed = time.perf_counter() - started
+    if job.timed_out:
+        status = "timeout"
+    elif job.dropped:
+        status = "output limit"
+    elif returncode != 0:
+        status = "exit %d" % returncode
+    else:
+        status = "pass" if outputs_match(job.stdout_text(), fixture) else "wrong output"
+    return {"test": fixture["name"], "status": status, "seconds": round(elapsed, 3)}
+
+
+def grade_exercises(submissions_dir, fixtures_dir, toolchain, match="exact", limits=None, workers=None,
+                    report_file=None, stream=sys.stdout):
+    # Compile every submission, run each against every fixture on all cores and report per student
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    limits = limits or ExecutionLimits()
+    workers = workers or available_cores()
+    compiler = toolchain.backend
+    if compiler is None:
+        print("No C# compiler found. Please install the .NET SDK or csc.", file=stream)
+        return 1
+    submissions = find_submissions(submissions_dir)
+    fixtures = find_fixtures(fixtures_dir, match)
+    if not submissions or not fixtures:
+        print("Found %d submissions in %s and %d fixtures in %s; nothing to grade."
+              % (len(submissions), submissions_dir, len(fixtures), fixtures_dir), file=stream)
+        return 1
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="csharp_grade_") as root:
+        students = compile_submissions(root, submissions, toolchain, limits, workers)
+        build_seconds = time.perf_counter() - started
+
+        runs = [(student, fixture) for student, result in students.items() if result["program"]
+                for fixture in fixtures]
+        for result in students.values():
+            result["tests"] = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(lambda run: run_exercise_test(students[run[0]]["program"], run[1], compiler, limits),
+                                    runs)
+            for (student, _), outcome in zip(runs, outcomes):
+                students[student]["tests"].append(outcome)
+        run_seconds = time.perf_counter() - started - build_seconds
+
+    report = []
+    for student, result in students.items():
+        passed = sum(1 for test in result["tests"] if test["status"] == "pass")
+        report.append({"student": student, "compiled": not result["errors"], "errors": result["errors"],
+                       "passed": passed, "total": len(fixtures), "tests": result["tests"]})
+        print("%-24s %s" % (student[:24], "%d/%d" % (passed, len(fixtures)) if result["program"] else "COMPILE ERROR"),
+              file=stream)
+        for error in result["errors"][:5]:
+            print("      " + error, file=stream)
+        for test in result["tests"]:
+            if test["status"] != "pass":
+                print("      %s: %s" % (test["test"], test["status"]), file=stream)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "students": len(report),
+        "compile_errors": sum(1 for row in report if not row["compiled"]),
+        "all_passed": sum(1 for row in report if row["compiled"] and row["passed"] == row["total"]),
+        "test_runs": len(runs),
+        "workers": workers,
+        "build_seconds": round(build_seconds, 2),
+        "run_seconds": round(run_seconds, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "runs_per_second": round(len(runs) / run_seconds, 1) if run_seconds > 0 else None,
+    }
+    print("\n%(students)d students, %(all_passed)d passed every test, %(compile_errors)d did not compile" % summary,
+          file=stream)
+    print("build %(build_seconds).1fs, %(test_runs)d test runs in %(run_seconds).1fs on %(workers)d workers "
+          "(%(runs_per_second)s runs/s), %(elapsed_seconds).1fs total" % summary, file=stream)
+
+    if report_file:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "students": report}, f, indent=4)
+    return 0
+
+
+# ---------------------------
+# Content Packs
+# ---------------------------
+
+# Extra courses: directories holding a manifest.json plus one text file per section
+CONTENT_PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_packs")
+CONTENT_CACHE_DIR = os.path.join(APP_DATA_DIR, "content_cache")
+CONTENT_CACHE_VERSION = 1
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LazyModule(dict):
+    # A module whose "sections" are read from its content pack the first time they are accessed
+
+    def __init__(self, title, pack, key):
+        super().__init__(title=title)
+        self.pack = pack
+        self.key = key
+
+    @property
+    def loaded(self):
+        return dict.__contains__(self, "sections")
+
+    def __missing__(self, key):
+        if key != "sections":
+            raise KeyError(key)
+        sections = self.pack.load_sections(self)
+        self["sections"] = sections
+        return sections
+
+
+class ContentPack:
+    # Reads a pack through a pickled cache: a small module index for startup, one blob per module
+
+    def __init__(self, root, cache_dir=CONTENT_CACHE_DIR):
+        self.root = os.path.abspath(root)
+        self.manifest_file = os.path.join(self.root, "manifest.json")
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16])
+
+    def _cache_file(self, name):
+        return os.path.join(self.cache_dir, name + ".pickle")
+
+    def _read_cache(self, name):
+        import pickle
+        try:
+            with open(self._cache_file(name), "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+            return None
+        return data if data.get("version") == CONTENT_CACHE_VERSION else None
+
+    def _write_cache(self, name, data):
+        import pickle
+        data["version"] = CONTENT_CACHE_VERSION
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = self._cache_file(name) + ".tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self._cache_file(name))
+        except OSError:
+            pass
+
+    def modules(self):
+        # (name, LazyModule) pairs; the manifest is only parsed when it changed since the last run
+        stamp = file_stamp(self.manifest_file)
+        index = self._read_cache("index")
+        if index is None or index["stamp"] != stamp:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            index = {"stamp": stamp, "modules": []}
+            for number, entry in enumerate(manifest.get("modules", [])):
+                key = "module%05d" % number
+                sections = [(section["heading"], section["file"]) for section in entry.get("sections", [])]
+                index["modules"].append((entry["name"], entry.get("title", entry["name"]), key))
+                # Section lists live with each module so startup never reads them
+                self._write_cache(key, {"entries": sections, "stamps": None})
+            self._write_cache("index", index)
+        return [(name, LazyModule(title, self, key)) for name, title, key in index["modules"]]
+
+    def load_sections(self, module):
+        blob = self._read_cache(module.key)
+        if blob is None:
+            # The module blob went missing; rebuild the index (and blobs) from the manifest
+            self._write_cache("index", {"stamp": None, "modules": []})
+            self.modules()
+            blob = self._read_cache(module.key) or {"entries": [], "stamps": None}
+
+        paths = [os.path.join(self.root, path) for _, path in blob["entries"]]
+        stamps = [file_stamp(path) for path in paths]
+        if blob["stamps"] == stamps:
+            sections = blob["sections"]
+            _documents[module["title"]] = (module, blob["document"])
+            return sections
+
+        sections = []
+        for (heading, _), path in zip(blob["entries"], paths):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except OSError as exc:
+                content = "Could not load this section: %s" % exc
+            sections.append({"heading": heading, "content": content})
+        document = Document(module["title"], tuple(Section(section["heading"], parse_blocks(section["content"]))
+                                                   for section in sections))
+        _documents[module["title"]] = (module, document)
+        blob.update(stamps=stamps, sections=sections, document=document)
+        self._write_cache(module.key, blob)
+        return sections
+
+
+def discover_content_packs(root):
+    # A directory is a pack if it has a manifest.json; packs may also be its immediate subdirectories
+    if not os.path.isdir(root):
+        return []
+    if os.path.exists(os.path.join(root, "manifest.json")):
+        return [ContentPack(root)]
+    return [ContentPack(os.path.join(root, name)) for name in sorted(os.listdir(root))
+            if os.path.exists(os.path.join(root, name, "manifest.json"))]
+
+
+def register_content_packs(roots, target=None):
+    # Add every pack module to `modules` (or target) without loading any section bodies
+    target = modules if target is None else target
+    for root in roots:
+        for pack in discover_content_packs(root):
+            try:
+                pack_modules = pack.modules()
+            except (OSError, ValueError, KeyError) as exc:
+                print("Skipping content pack %s: %s" % (pack.root, exc), file=sys.stderr)
+                continue
+            for name, module in pack_modules:
+                if name in target:
+                    print("Skipping module %r from %s: the name is already in use" % (name, pack.root), file=sys.stderr)
+                    continue
+                target[name] = module
+    return target
+
+
+# ---------------------------
+# Search Index
+# ---------------------------
+
+TOKEN_RE = re.compile(r"[a-z0-9_#]+")
+# Weight of a match by where it occurs
+FIELD_WEIGHTS = {"heading": 3.0, "prose": 1.0, "code": 0.5}
+MAX_SEARCH_RESULTS = 50
+SEARCH_DEBOUNCE_MS = 150
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchResult:
+    __slots__ = ("module", "section", "heading", "kind", "text", "score")
+
+    def __init__(self, module, section, heading, kind, text, score):
+        self.module = module
+        self.section = section
+        self.heading = heading
+        self.kind = kind
+        self.text = text
+        self.score = score
+
+
+class SearchIndex:
+    # Inverted index over every heading, prose line and code block of every module
+
+    def __init__(self):
+        self.entries = {}
+        self.postings = {}
+        self.module_entries = {}
+        self.module_sources = {}
+        self._next_id = 0
+        self._vocabulary = None
+
+    def refresh(self, modules):
+        # Re-index only modules that were added or replaced, drop removed ones; True if anything changed
+        changed = False
+        for name in list(self.module_sources):
+            if name not in modules:
+                self.remove_module(name)
+                changed = True
+        for name, module in modules.items():
+            if isinstance(module, LazyModule) and not module.loaded:
+                # Indexed once it has been opened, so searching never forces a pack to load
+                continue
+            if self.module_sources.get(name) is not module:
+                self.update_module(name, module)
+                changed = True
+        return changed
+
+    def update_module(self, name, module):
+        self.remove_module(name)
+        self.module_sources[name] = module
+        ids = self.module_entries[name] = []
+        for section_index, section in enumerate(parse_module(module).sections):
+            ids.append(self._add(name, section_index, section.heading, "heading", section.heading))
+            for block in section.blocks:
+                if isinstance(block, CodeBlock):
+                    ids.append(self._add(name, section_index, section.heading, "code", block.code))
+                elif isinstance(block, (Paragraph, ListItem)):
+                    ids.append(self._add(name, section_index, section.heading, "prose",
+                                         "".join(span.text for span in block.spans)))
+                elif isinstance(block, Heading):
+                    ids.append(self._add(name, section_index, section.heading, "prose", block.text))
+
+    def remove_module(self, name):
+        for entry_id in self.module_entries.pop(name, []):
+            for token in set(tokenize(self.entries.pop(entry_id)[4])):
+                postings = self.postings[token]
+                del postings[entry_id]
+                if not postings:
+                    del self.postings[token]
+                    self._vocabulary = None
+        self.module_sources.pop(name, None)
+
+    def _add(self, module, section, heading, kind, text):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (module, section, heading, kind, text)
+        for token, count in collections.Counter(tokenize(text)).items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self._vocabulary = None
+            postings[entry_id] = count
+        return entry_id
+
+    def expand_prefix(self, prefix):
+        # Indexed tokens starting with prefix, via binary search over the sorted vocabulary
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\uffff")
+        return self._vocabulary[start:end]
+
+    def query(self, text, limit=MAX_SEARCH_RESULTS, candidates=None):
+        # All terms must match; the last one may be a prefix so partial words find results.
+        # `candidates` restricts scoring to the entry ids of a previous result.
+        terms = tokenize(text)
+        if not terms:
+            return [], set()
+
+        total = len(self.entries) or 1
+        term_postings = []
+        for position, term in enumerate(terms):
+            tokens = self.expand_prefix(term) if position == len(terms) - 1 else [term]
+            weighted = [(self.postings[token], math.log(1 + total / len(self.postings[token])))
+                        for token in tokens if token in self.postings]
+            if not weighted:
+                return [], set()
+            term_postings.append(weighted)
+
+        # Start from the rarest term so the other terms only probe its matches
+        term_postings.sort(key=lambda weighted: sum(len(postings) for postings, _ in weighted))
+        scores = {}
+        for postings, idf in term_postings[0]:
+            for entry_id, count in postings.items():
+                if candidates is None or entry_id in candidates:
+                    scores[entry_id] = scores.get(entry_id, 0.0) + count * idf
+        for weighted in term_postings[1:]:
+            narrowed = {}
+            for entry_id, score in scores.items():
+                extra = 0.0
+                for postings, idf in weighted:
+                    count = postings.get(entry_id)
+                    if count:
+                        extra += count * idf
+                if extra:
+                    narrowed[entry_id] = score + extra
+            scores = narrowed
+            if not scores:
+                return [], set()
+
+        for entry_id in scores:
+            scores[entry_id] *= FIELD_WEIGHTS[self.entries[entry_id][3]]
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [SearchResult(*self.entries[entry_id], score=score) for entry_id, score in best], set(scores)
+
+
+# ---------------------------
+# Glossary Linking
+# ---------------------------
+
+GLOSSARY_ENTRY_RE = re.compile(r"^\s*\*\*(?P<term>[^*]+)\*\*:\s*(?P<definition>.+?)\s*$")
+
+
+# Words and single punctuation marks; terms are matched token by token so matches are whole words
+TERM_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class TermMatcher:
+    # Aho-Corasick automaton over the lower-cased tokens of the patterns. find() walks the tokens of a
+    # line once, whatever the number of patterns, and returns leftmost-longest, non-overlapping matches.
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        # Per state: token count of the pattern ending here (0 if none), and the pattern itself
+        self.length = [0]
+        self.pattern = [None]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        state = 0
+        tokens = TERM_TOKEN_RE.findall(pattern.lower())
+        for token in tokens:
+            next_state = self.goto[state].get(token)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][token] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.length.append(0)
+                self.pattern.append(None)
+            state = next_state
+        if state:
+            self.length[state] = len(tokens)
+            self.pattern[state] = pattern
+
+    def _link(self):
+        # Breadth-first failure links; each state also inherits the output of its failure state
+        # so a shorter pattern ending inside a longer partial match is still reported
+        self.output = [[] for _ in self.goto]
+        pending = collections.deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            if self.length[state]:
+                self.output[state].append(state)
+            self.output[state].extend(self.output[self.fail[state]])
+            for token, next_state in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(token, 0)
+                pending.append(next_state)
+
+    def find(self, text):
+        # [(start, end, pattern)] as character offsets into text
+        goto, fail, output, length = self.goto, self.fail, self.output, self.length
+        # Most lines contain no term at all; rule them out with one set operation
+        if goto[0].keys().isdisjoint(TERM_TOKEN_RE.findall(text.lower())):
+            return []
+        tokens = []
+        best = {}
+        state = 0
+        for match in TERM_TOKEN_RE.finditer(text):
+            token = match.group().lower()
+            tokens.append(match)
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for found in output[state]:
+                # Keep the longest pattern per starting token
+                start = len(tokens) - length[found]
+                if length[found] > best.get(start, (0, None))[0]:
+                    best[start] = (length[found], found)
+        matches = []
+        covered = 0
+        for start in sorted(best):
+            size, found = best[start]
+            if start >= covered:
+                matches.append((tokens[start].start(), tokens[start + size - 1].end(), self.pattern[found]))
+                covered = start + size
+        return matches
+
+
+class Glossary:
+    # Terms and definitions parsed from the glossary module, with singular aliases for plural terms
+
+    def __init__(self, module):
+        self.module = module
+        self.definitions = collections.OrderedDict()
+        self.aliases = {}
+        for section in module["sections"]:
+            for line in section["content"].split("\n"):
+                match = GLOSSARY_ENTRY_RE.match(line)
+                if match:
+                    self.add(match.group("term").strip(), match.group("definition"))
+        self.matcher = TermMatcher(self.aliases)
+
+    def add(self, term, definition):
+        self.definitions[term] = definition
+        self.aliases[term.lower()] = term
+        if term.endswith("s") and not term.endswith("ss") and len(term) > 3:
+            self.aliases.setdefault(term[:-1].lower(), term)
+
+    def term_for(self, text):
+        return self.aliases.get(text.lower())
+
+    def definition(self, text):
+        term = self.term_for(text)
+        return (term, self.definitions[term]) if term else (None, None)
+
+    def find(self, line):
+        return self.matcher.find(line)
+
+
+# Built the first time a module is rendered; rebuilt if the glossary module is replaced
+_glossary = None
+
+def get_glossary(module=None):
+    global _glossary
+    module = module or glossary_content
+    if _glossary is None or _glossary.module is not module:
+        _glossary = Glossary(module)
+    return _glossary
+
+
+# ---------------------------
+# Syntax Highlighting
+# ---------------------------
+
+CSHARP_KEYWORDS = frozenset("""
+    abstract as base bool break byte case catch char checked class const continue decimal default delegate do
+    double else enum event explicit extern false finally fixed float for foreach goto if implicit in int interface
+    internal is lock long namespace new null object operator out override params private protected public readonly
+    ref return sbyte sealed short sizeof stackalloc static string struct switch this throw true try typeof uint ulong
+    unchecked unsafe ushort using virtual void volatile while
+    add alias and async await by descending dynamic equals from get global group init into join let managed nameof
+    nint not notnull nuint on or orderby partial record remove required select set unmanaged value var when where
+    with yield
+""".split())
+
+# Lexer state at the end of a line: plain code, inside /* */, or inside a verbatim @"..." string
+LEX_CODE, LEX_COMMENT, LEX_VERBATIM = 0, 1, 2
+SYNTAX_KINDS = ("keyword", "string", "comment", "number", "preprocessor")
+
+CSHARP_TOKEN_RE = re.compile(r"""
+    (?P<comment>//.*)
+  | (?P<block_comment>/\*(?:.*?(?P<comment_end>\*/)|.*))
+  | (?P<verbatim>\$?@\$?"(?:[^"]|"")*(?P<closed>")?)
+  | (?P<string>\$?"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?)
+  | (?P<preprocessor>^[ \t]*\#.*)
+  | (?P<number>\b(?:0[xX][0-9a-fA-F_]+|0[bB][01_]+|\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)[fFdDmMuUlL]*)
+  | (?P<word>@?[A-Za-z_]\w*)
+""", re.VERBOSE)
+BLOCK_COMMENT_END_RE = re.compile(r"\*/")
+VERBATIM_END_RE = re.compile(r'(?:[^"]|"")*"')
+
+# (state, line) -> (tokens, end state). Editing a snippet only tokenizes the lines that changed:
+# the others, and the lines after the edit once the lexer state is the same again, are hits here.
+LINE_TOKEN_CACHE_SIZE = 20000
+_line_tokens = {}
+# Snippet hash -> {kind: [(line, start, end)]}
+HIGHLIGHT_CACHE_SIZE = 512
+_highlights = collections.OrderedDict()
+
+
+def tokenize_csharp_line(line, state):
+    # [(start, end, kind)] and the state the next line starts in
+    tokens = []
+    position = 0
+    if state == LEX_COMMENT:
+        match = BLOCK_COMMENT_END_RE.search(line)
+        if match is None:
+            return ([(0, len(line), "comment")] if line else []), LEX_COMMENT
+        position = match.end()
+        tokens.append((0, position, "comment"))
+    elif state == LEX_VERBATIM:
+        match = VERBATIM_END_RE.match(line)
+        if match is None:
+            return ([(0, len(line), "string")] if line else []), LEX_VERBATIM
+        position = match.end()
+        tokens.append((0, position, "string"))
+
+    state = LEX_CODE
+    for match in CSHARP_TOKEN_RE.finditer(line, position):
+        kind = match.lastgroup
+        if kind == "word":
+            if match.group() not in CSHARP_KEYWORDS:
+                continue
+            kind = "keyword"
+        elif kind == "block_comment":
+            if match.group("comment_end") is None:
+                state = LEX_COMMENT
+            kind = "comment"
+        elif kind == "verbatim":
+            if match.group("closed") is None:
+                state = LEX_VERBATIM
+            kind = "string"
+        tokens.append((match.start(), match.end(), kind))
+    return tokens, state
+
+
+def highlight_csharp(code):
+    # {kind: [(line offset, start, end)]} for a snippet, cached by its hash
+    key = snippet_key(code)
+    highlight = _highlights.get(key)
+    if highlight is not None:
+        _highlights.move_to_end(key)
+        return highlight
+
+    highlight = {kind: [] for kind in SYNTAX_KINDS}
+    state = LEX_CODE
+    for number, line in enumerate(code.split("\n")):
+        cached = _line_tokens.get((state, line))
+        if cached is None:
+            if len(_line_tokens) >= LINE_TOKEN_CACHE_SIZE:
+                _line_tokens.clear()
+            cached = _line_tokens[(state, line)] = tokenize_csharp_line(line, state)
+        tokens, state = cached
+        for start, end, kind in tokens:
+            highlight[kind].append((number, start, end))
+
+    _highlights[key] = highlight
+    if len(_highlights) > HIGHLIGHT_CACHE_SIZE:
+        _highlights.popitem(last=False)
+    return highlight
+
+
+# ---------------------------
+# Module Rendering
+# ---------------------------
+
+DEFAULT_CACHED_VIEWS = 4
+# Background compilation of the shown module starts after this pause, so quick navigation does not build
+PRECOMPILE_DELAY_MS = 400
+PRECOMPILE_POLL_MS = 250
+# Above this many modules the navigation becomes a tree of collapsed groups instead of buttons
+NAV_TREE_THRESHOLD = 12
+
+# Text tag used for each inline span style
+SPAN_TAGS = {"bold": "bold", "code": "inline_code"}
+
+class ModuleView(ttk.Frame):
+    # Draws a whole module into one Text widget; only the code-block actions are embedded widgets
+
+    def __init__(self, master, app, module):
+        super().__init__(master)
+        self.app = app
+        self.module = module
+        self.lines = []
+        self.section_lines = []
+        self.section_headings = []
+        self.code_blocks = []
+        # Code -> status labels next to its Execute buttons
+        self.code_status = {}
+        self._line = 1
+        # Search highlight state, kept so an extended query only rescans lines that already matched
+        self.lower_lines = None
+        self.highlight_terms = []
+        self.matched_lines = []
+        # Definition popup for glossary links, created on first hover
+        self.term_tip = None
+
+        self.text = tk.Text(self, wrap=tk.WORD, borderwidth=0, highlightthickness=0, padx=20, pady=10,
+                            cursor="arrow", font=("Segoe UI", 12))
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.text.yview)
+        self.text.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side='right', fill='y')
+        self.text.pack(side='left', fill='both', expand=True)
+
+        self.text.tag_configure("title", font=("Segoe UI", 20, "bold"), justify='center', spacing3=10)
+        self.text.tag_configure("subheading", font=("Segoe UI", 16, "bold"), spacing1=10, spacing3=5)
+        self.text.tag_configure("content", font=("Segoe UI", 12))
+        self.text.tag_configure("heading3", font=("Segoe UI", 12, "bold"), spacing1=5)
+        self.text.tag_configure("list", font=("Segoe UI", 12), lmargin1=10, lmargin2=25)
+        self.text.tag_configure("bold", font=("Segoe UI", 12, "bold"))
+        self.text.tag_configure("inline_code", font=("Consolas", 11))
+        self.text.tag_configure("code", font=("Consolas", 12), lmargin1=20, lmargin2=20, rmargin=20)
+        self.text.tag_configure("code_actions", lmargin1=20, spacing3=5)
+        for kind in SYNTAX_KINDS:
+            self.text.tag_configure("syntax_" + kind)
+        self.text.tag_configure("glossary", underline=True)
+        self.text.tag_bind("glossary", "<Enter>", self.show_term_tip)
+        self.text.tag_bind("glossary", "<Motion>", self.show_term_tip)
+        self.text.tag_bind("glossary", "<Leave>", self.hide_term_tip)
+        self.text.tag_bind("glossary", "<Button-1>", self.open_term)
+        self.apply_palette(app.palette)
+        self.dark_mode = app.dark_mode
+
+        self.render()
+        self.text.configure(state='disabled')
+
+    def apply_palette(self, palette):
+        self.text.configure(bg=palette["background"], fg=palette["foreground"],
+                            insertbackground=palette["foreground"])
+        self.text.tag_configure("code", background=palette["code_background"])
+        self.text.tag_configure("inline_code", background=palette["code_background"])
+        self.text.tag_configure("highlight", background=palette["highlight"])
+        self.text.tag_configure("glossary", foreground=palette["link"])
+        for kind in SYNTAX_KINDS:
+            self.text.tag_configure("syntax_" + kind, foreground=palette[kind])
+        self.palette = palette
+
+    def render(self):
+        # Everything is inserted with a single Text.insert call; embedded windows are added afterwards
+        with tracer.span("render.parse"):
+            document = parse_module(self.module)
+        with tracer.span("render.insert", module=document.title):
+            segments = []
+            self.add_segment(segments, document.title + "\n", "title")
+            for section in document.sections:
+                self.section_lines.append(self._line)
+                self.section_headings.append(section.heading)
+                self.add_segment(segments, section.heading + "\n", "subheading")
+                self.insert_blocks(segments, section.blocks)
+            self.text.insert("1.0", *segments)
+            self.lines = self.text.get("1.0", "end-1c").split("\n")
+
+            for index, line in enumerate(self.section_lines):
+                self.text.mark_set("section%d" % index, "%d.0" % line)
+                self.text.mark_gravity("section%d" % index, 'left')
+            for line, code in self.code_blocks:
+                self.text.window_create("%d.0" % line, window=self.create_code_actions(code))
+
+            # Special handling for quizzes
+            if self.module == quizzes_content:
+                self.text.insert("end", "\n")
+                self.text.window_create("end", window=self.app.display_quiz(self.text))
+
+        with tracer.span("render.syntax", module=document.title):
+            self.highlight_syntax()
+        with tracer.span("render.link", module=document.title):
+            self.link_terms()
+
+    def add_segment(self, segments, text, tags):
+        segments.append(text)
+        segments.append(tags)
+        self._line += text.count("\n")
+
+    def add_spans(self, segments, spans, tag):
+        for span in spans:
+            self.add_segment(segments, span.text, tag if span.style == "text" else (tag, SPAN_TAGS[span.style]))
+        self.add_segment(segments, "\n", tag)
+
+    def insert_blocks(self, segments, blocks):
+        for block in blocks:
+            if isinstance(block, Paragraph):
+                self.add_spans(segments, block.spans, "content")
+            elif isinstance(block, BlankLine):
+                self.add_segment(segments, "\n", "content")
+            elif isinstance(block, ListItem):
+                self.add_segment(segments, "\u2022 ", "list")
+                self.add_spans(segments, block.spans, "list")
+            elif isinstance(block, Heading):
+                self.add_segment(segments, block.text + "\n", "heading3")
+            elif isinstance(block, CodeBlock):
+                self.add_segment(segments, block.code, "code")
+                if block.language == "csharp":
+                    # One empty line per block holds its action widgets
+                    self.code_blocks.append((self._line, block.code))
+                    self.add_segment(segments, "\n", "code_actions")
+
+    def create_code_actions(self, code):
+        frame = ttk.Frame(self.text)
+        ttk.Button(frame, text="Execute Code", command=lambda: self.app.execute_csharp_code(code)).pack(side='left')
+        status = ttk.Label(frame, style='Content.TLabel')
+        status.pack(side='left', padx=10)
+        self.code_status.setdefault(code, []).append(status)
+        return frame
+
+    def set_code_status(self, code, text):
+        for label in self.code_status.get(code, ()):
+            label.config(text=text)
+
+    def visible_code(self):
+        # Snippets whose block overlaps the visible part of the text
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index("@0,%d" % self.text.winfo_height()).split(".")[0])
+        return {code for line, code in self.code_blocks if line >= first and line - code.count("\n") - 1 <= last}
+
+    def highlight_syntax(self):
+        # Token ranges come from the per-snippet cache; one tag_add per token kind for the whole module
+        ranges = {kind: [] for kind in SYNTAX_KINDS}
+        for line, code in self.code_blocks:
+            first = line - code.count("\n")
+            for kind, tokens in highlight_csharp(code).items():
+                indexes = ranges[kind]
+                for number, start, end in tokens:
+                    indexes.append("%d.%d" % (first + number, start))
+                    indexes.append("%d.%d" % (first + number, end))
+        for kind, indexes in ranges.items():
+            if indexes:
+                self.text.tag_add("syntax_" + kind, *indexes)
+        return ranges
+
+    def link_terms(self):
+        # One automaton pass over the prose lines; the title, every heading kind and code are left alone
+        glossary = get_glossary()
+        if self.module is glossary.module:
+            return
+        skipped = set()
+        for tag in ("title", "subheading", "heading3", "code"):
+            ranges = self.text.tag_ranges(tag)
+            for start, end in zip(ranges[0::2], ranges[1::2]):
+                first = int(str(start).split(".")[0])
+                last, column = (int(part) for part in str(end).split("."))
+                skipped.update(range(first, last + 1 if column else last))
+
+        ranges = []
+        for number, line in enumerate(self.lines, 1):
+            if number in skipped:
+                continue
+            for start, end, _ in glossary.find(line):
+                ranges.append("%d.%d" % (number, start))
+                ranges.append("%d.%d" % (number, end))
+        if ranges:
+            self.text.tag_add("glossary", *ranges)
+        return ranges
+
+    def hovered_term(self):
+        term_range = self.text.tag_prevrange("glossary", "current+1c")
+        if not term_range:
+            return None, None
+        return get_glossary().definition(self.text.get(*term_range))
+
+    def show_term_tip(self, event):
+        term, definition = self.hovered_term()
+        if term is None:
+            self.hide_term_tip()
+            return
+        if self.term_tip is None:
+            self.term_tip = tk.Toplevel(self)
+            self.term_tip.overrideredirect(True)
+            self.term_tip.label = tk.Label(self.term_tip, justify='left', wraplength=420, relief='solid',
+                                           borderwidth=1, padx=8, pady=4, font=("Segoe UI", 11))
+            self.term_tip.label.pack()
+        self.term_tip.label.config(text="%s: %s" % (term, definition), bg=self.palette["code_background"],
+                                   fg=self.palette["foreground"])
+        self.term_tip.geometry("+%d+%d" % (event.x_root + 12, event.y_root + 16))
+        self.term_tip.deiconify()
+        self.text.config(cursor="hand2")
+
+    def hide_term_tip(self, event=None):
+        if self.term_tip is not None:
+            self.term_tip.withdraw()
+        self.text.config(cursor="arrow")
+
+    def open_term(self, event):
+        term, _ = self.hovered_term()
+        if term is not None:
+            self.hide_term_tip()
+            self.app.show_glossary_term(term)
+
+    def scroll_to_term(self, term):
+        prefix = term + ":"
+        for number, line in enumerate(self.lines, 1):
+            if line.lstrip("\u2022 ").startswith(prefix):
+                self.text.yview("%d.0" % number)
+                return True
+        return False
+
+    def highlight(self, terms):
+        # Tag each occurrence of the terms. When every term only grew since the last call, the
+        # matches must lie on lines that matched before, so only those lines are rescanned.
+        if self.lower_lines is None:
+            self.lower_lines = [line.lower() for line in self.lines]
+        previous = self.highlight_terms
+        narrowing = (previous and len(previous) == len(terms)
+                     and all(term.startswith(old) for term, old in zip(terms, previous)))
+        line_numbers = self.matched_lines if narrowing else range(1, len(self.lower_lines) + 1)
+
+        ranges = []
+        matched = []
+        for number in line_numbers:
+            line = self.lower_lines[number - 1]
+            hit = False
+            for term in terms:
+                start = line.find(term)
+                while start != -1:
+                    end = start + len(term)
+                    ranges.append("%d.%d" % (number, start))
+                    ranges.append("%d.%d" % (number, end))
+                    hit = True
+                    start = line.find(term, end)
+            if hit:
+                matched.append(number)
+
+        self.text.tag_remove("highlight", "1.0", "end")
+        if ranges:
+            self.text.tag_add("highlight", *ranges)
+        self.highlight_terms = list(terms)
+        self.matched_lines = matched
+        return ranges
+
+    def clear_highlights(self):
+        self.text.tag_remove("highlight", "1.0", "end")
+        self.highlight_terms = []
+        self.matched_lines = []
+
+    def scroll_to_section(self, index):
+        self.text.yview("section%d" % index)
+
+    def current_section(self):
+        # Heading of the section shown at the top of the view
+        if not self.section_headings:
+            return ""
+        top = int(self.text.index("@0,0").split(".")[0])
+        return self.section_headings[max(bisect.bisect_right(self.section_lines, top) - 1, 0)]
+
+    def widget_count(self):
+        count = 0
+        pending = [self]
+        while pending:
+            widget = pending.pop()
+            count += 1
+            pending.extend(widget.winfo_children())
+        return count
+
+
+def benchmark_render(lines=5000, stream=sys.stdout):
+    # Render a synthetic module of roughly `lines` lines and report the time and widget count
+    module = synthetic_module(lines)
+
+    app = CSharpTrainerApp(precompile=False)
+    try:
+        app.update()
+        app.current_view.pack_forget()
+        # The view is built directly so the synthetic module is not recorded in progress
+        started = time.perf_counter()
+        view = ModuleView(app.content_area, app, module)
+        view.pack(fill='both', expand=True)
+        app.update_idletasks()
+        elapsed = time.perf_counter() - started
+        print("Rendered %d lines in %.1f ms using %d widgets" % (len(view.lines), elapsed * 1000, view.widget_count()),
+              file=stream)
+    finally:
+        app.on_close()
+    return elapsed
+
+
+# ---------------------------
+# Notes Window
+# ---------------------------
+
+NOTE_SAVE_DELAY_MS = 300
+NOTE_SEARCH_DELAY_MS = 200
+
+
+class NotesWindow(tk.Toplevel):
+    # One note per module section. Edits are handed to the progress store shortly after typing
+    # stops; the store writes them on its own thread, so nothing here waits on the disk.
+
+    def __init__(self, master, store):
+        super().__init__(master)
+        self.store = store
+        self.key = None
+        self.note_keys = {}
+        self.save_after_id = None
+        self.search_after_id = None
+
+        self.title("My Notes")
+        self.geometry("950x550")
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        search_frame = ttk.Frame(self)
+        search_frame.pack(fill='x', padx=10, pady=(10, 0))
+        ttk.Label(search_frame, text="Search notes:").pack(side='left')
+        self.search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side='left', fill='x', expand=True, padx=5)
+        self.search_var.trace_add("write", self.on_search_changed)
+
+        panes = ttk.PanedWindow(self, orient='horizontal')
+        panes.pack(fill='both', expand=True, padx=10, pady=10)
+        self.note_list = ttk.Treeview(panes, columns=("module", "section", "text"), show='headings',
+                                      selectmode='browse')
+        for column, heading, width in (("module", "Module", 110), ("section", "Section", 130), ("text", "Note", 200)):
+            self.note_list.heading(column, text=heading)
+            self.note_list.column(column, width=width)
+        self.note_list.bind("<<TreeviewSelect>>", self.on_note_selected)
+        panes.add(self.note_list, weight=1)
+
+        editor_frame = ttk.Frame(panes)
+        self.heading = tk.Label(editor_frame, font=("Segoe UI", 14, "bold"), anchor='w')
+        self.heading.pack(fill='x')
+        self.editor = scrolledtext.ScrolledText(editor_frame, wrap=tk.WORD, font=("Segoe UI", 12), undo=True)
+        self.editor.pack(fill='both', expand=True, pady=5)
+        self.editor.bind("<<Modified>>", self.on_modified)
+        tk.Label(editor_frame, text="Notes are saved automatically.", anchor='w').pack(fill='x')
+        panes.add(editor_frame, weight=2)
+
+    def open_note(self, module, section):
+        self.save_now()
+        self.key = (module, section)
+        self.heading.config(text="%s \u2013 %s" % (module, section) if section else module)
+        self.editor.delete("1.0", tk.END)
+        self.editor.insert("1.0", self.store.get_note(module, section))
+        self.editor.edit_reset()
+        self.editor.edit_modified(False)
+        self.refresh_list()
+
+    def on_modified(self, event=None):
+        if not self.editor.edit_modified():
+            return
+        self.editor.edit_modified(False)
+        if self.save_after_id is not None:
+            self.after_cancel(self.save_after_id)
+        self.save_after_id = self.after(NOTE_SAVE_DELAY_MS, self.save_now)
+
+    def save_now(self):
+        if self.save_after_id is None:
+            return
+        self.after_cancel(self.save_after_id)
+        self.save_after_id = None
+        body = self.editor.get("1.0", "end-1c")
+        self.store.save_note(self.key[0], self.key[1], body if body.strip() else "")
+
+    def on_search_changed(self, *args):
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(NOTE_SEARCH_DELAY_MS, self.refresh_list)
+
+    def refresh_list(self):
+        self.search_after_id = None
+        with tracer.span("notes.search"):
+            rows = self.store.search_notes(self.search_var.get())
+        self.note_list.delete(*self.note_list.get_children())
+        self.note_keys = {}
+        for module, section, text in rows:
+            item = self.note_list.insert("", "end", values=(module, section, " ".join(text.split())))
+            self.note_keys[item] = (module, section)
+
+    def on_note_selected(self, event=None):
+        selection = self.note_list.selection()
+        if selection and self.note_keys.get(selection[0]) not in (None, self.key):
+            self.open_note(*self.note_keys[selection[0]])
+
+    def cleared(self):
+        # Called after every note was deleted; pending edits must not bring the open one back
+        if self.save_after_id is not None:
+            self.after_cancel(self.save_after_id)
+            self.save_after_id = None
+        self.editor.delete("1.0", tk.END)
+        self.editor.edit_modified(False)
+        self.refresh_list()
+
+    def close(self):
+        self.save_now()
+        self.destroy()
+
 
 # ---------------------------
 # Main Application Class
 # ---------------------------
 
 class CSharpTrainerApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, prewarm=0, cache_size_mb=DEFAULT_BUILD_CACHE_MB, limits=None, cached_views=DEFAULT_CACHED_VIEWS,
+                 on_interactive=None, progress_store=None, question_files=(), quiz_length=QUIZ_LENGTH,
+                 quiz_module=None, quiz_difficulty=None,
+                 execution_host=False, precompile=True):
         super().__init__()
 
         # Window configuration
@@ -488,11 +3985,51 @@ class CSharpTrainerApp(tk.Tk):
         # State variables
         self.dark_mode = False
         self.current_module = None
-        self.note_content = ""
+        self.current_view = None
+        # Rendered module views kept hidden for instant revisits, least recently used first
+        self.view_cache = collections.OrderedDict()
+        self.max_cached_views = max(1, cached_views)
+        self.notes_window = None
         self.current_search_term = ""
+        self.search_index = SearchIndex()
+        # Entry ids matched by the last query, reused when the next query only extends it
+        self.search_candidates = None
+        self.search_after_id = None
         self.quiz_vars = []
+        self.quiz_session = None
+        self.question_bank = None
+        self.question_files = question_files
+        self.quiz_length = quiz_length
+        self.quiz_module = quiz_module
+        self.quiz_difficulty = quiz_difficulty
         self.score = 0
-        self.progress = self.load_progress()
+        # Loaded in finish_startup, after the first frame is on screen
+        self.progress = {}
+        self.progress_store = progress_store or ProgressStore()
+        self.on_interactive = on_interactive
+
+        self.current_job = None
+        self.current_job_module = None
+        # Build-only jobs for the snippets of the shown module: (view, code, job)
+        self.precompile = precompile
+        self.precompile_jobs = []
+        self.precompile_after_id = None
+
+        # Warm dotnet project workspaces reused across executions
+        self.workspace_pool = WorkspacePool()
+        self.build_cache = BuildCache(max_bytes=cache_size_mb * 1024 * 1024)
+        self.prewarm = prewarm
+
+        # Compilers are probed once in the background instead of scanning PATH on every click
+        self.toolchain = ToolchainRegistry()
+        self.toolchain.probe_in_background(on_ready=self.on_toolchain_ready)
+
+        # Optional long-lived dotnet process that runs compiled snippets without a runtime start per run
+        self.execution_host = DotnetHost(limits=limits) if execution_host else None
+
+        # Compile/run happens on scheduler worker threads; the UI polls the current job
+        self.scheduler = ExecutionScheduler(self.workspace_pool, self.toolchain, self.build_cache, limits,
+                                            host=self.execution_host)
 
         # Style configuration
         self.style = ttk.Style(self)
@@ -504,24 +4041,50 @@ class CSharpTrainerApp(tk.Tk):
         # Create main layout frames
         self.create_main_frames()
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Paint the empty skeleton now; navigation and the first module follow once the loop is idle
+        self.update_idletasks()
+        mark_startup("first_paint")
+        self.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        self.progress = self.load_progress()
+
         # Navigation
         self.create_navigation()
 
         # Display default module
         self.display_content(modules["Introduction"])
 
+        self.update_idletasks()
+        mark_startup("interactive")
+        if self.on_interactive is not None:
+            self.on_interactive(self)
+
     def create_menu(self):
         menubar = tk.Menu(self)
 
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="Toggle Dark Mode", command=self.toggle_dark_mode)
+        view_menu.add_separator()
+        view_menu.add_command(label="Build Cache Statistics", command=self.show_cache_stats)
+        view_menu.add_command(label="Clear Build Cache", command=self.clear_build_cache)
 
         notes_menu = tk.Menu(menubar, tearoff=0)
         notes_menu.add_command(label="View Notes", command=self.view_notes)
         notes_menu.add_command(label="Clear Notes", command=self.clear_notes)
 
+        performance_menu = tk.Menu(menubar, tearoff=0)
+        performance_menu.add_command(label="Timing Summary", command=self.show_performance)
+        performance_menu.add_separator()
+        performance_menu.add_command(label="Export Prometheus Metrics...", command=self.export_prometheus)
+        performance_menu.add_command(label="Export Chrome Trace...", command=self.export_chrome_trace)
+        performance_menu.add_command(label="Reset Timings", command=tracer.reset)
+
         menubar.add_cascade(label="View", menu=view_menu)
         menubar.add_cascade(label="Notes", menu=notes_menu)
+        menubar.add_cascade(label="Performance", menu=performance_menu)
 
         self.config(menu=menubar)
 
@@ -534,24 +4097,12 @@ class CSharpTrainerApp(tk.Tk):
         self.top_frame = ttk.Frame(self, padding=10)
         self.top_frame.pack(side='top', fill='x')
 
-        # Content Frame (main display area) with Scrollbar
-        self.content_canvas = tk.Canvas(self, bg=self['bg'])
-        self.content_canvas.pack(side='right', fill='both', expand=True)
-
-        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.content_canvas.yview)
-        self.scrollbar.pack(side='right', fill='y')
-
-        self.content_canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        # Bind mousewheel to scroll
-        self.content_canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        # Output console (packed before the content area so it keeps its height)
+        self.create_console()
 
-        # Create a frame inside the canvas
-        self.content_frame = ttk.Frame(self.content_canvas, padding=10)
-        self.content_canvas.create_window((0, 0), window=self.content_frame, anchor='nw')
-
-        # Configure resizing
-        self.content_frame.bind("<Configure>", self.on_frame_configure)
+        # Content area (main display area); each module is drawn by a ModuleView
+        self.content_area = ttk.Frame(self)
+        self.content_area.pack(side='right', fill='both', expand=True)
 
         # Search Bar
         tk.Label(self.top_frame, text="Search:", font=('Segoe UI', 12)).pack(side='left')
@@ -560,16 +4111,38 @@ class CSharpTrainerApp(tk.Tk):
         self.search_entry.pack(side='left', padx=5)
         ttk.Button(self.top_frame, text="Search", command=self.search_content).pack(side='left')
         ttk.Button(self.top_frame, text="Clear Search", command=self.clear_search).pack(side='left', padx=(10,0))
-
-    def on_frame_configure(self, event):
-        self.content_canvas.configure(scrollregion=self.content_canvas.bbox("all"))
-
-    def _on_mousewheel(self, event):
-        # For Windows and MacOS
-        if self.dark_mode:
-            self.content_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        else:
-            self.content_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self.search_entry.bind("<Return>", lambda event: self.search_content())
+        self.search_var.trace_add("write", self.on_search_changed)
+
+        # Cross-module search results; packed only while there is something to show
+        self.results_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        self.results_tree = ttk.Treeview(self.results_frame, columns=("module", "section", "match"),
+                                         show='headings', height=6, selectmode='browse')
+        for column, heading, width in (("module", "Module", 150), ("section", "Section", 250), ("match", "Match", 600)):
+            self.results_tree.heading(column, text=heading)
+            self.results_tree.column(column, width=width, anchor='w')
+        results_scrollbar = ttk.Scrollbar(self.results_frame, orient='vertical', command=self.results_tree.yview)
+        self.results_tree.configure(yscrollcommand=results_scrollbar.set)
+        results_scrollbar.pack(side='right', fill='y')
+        self.results_tree.pack(side='left', fill='x', expand=True)
+        self.results_tree.bind("<<TreeviewSelect>>", self.on_result_selected)
+        self.search_results = []
+
+    def create_console(self):
+        self.console_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        self.console_frame.pack(side='bottom', fill='x')
+
+        header = ttk.Frame(self.console_frame)
+        header.pack(fill='x', pady=(0, 5))
+        self.console_status = ttk.Label(header, text="Output", style='Content.TLabel')
+        self.console_status.pack(side='left')
+        ttk.Button(header, text="Clear", command=lambda: self.console.clear()).pack(side='right')
+        self.cancel_button = ttk.Button(header, text="Cancel", command=self.cancel_execution)
+        self.cancel_button.pack(side='right', padx=(0, 10))
+        self.cancel_button.state(['disabled'])
+
+        self.console = OutputConsole(self.console_frame)
+        self.console.pack(fill='x')
 
     def create_navigation(self):
         title_label = ttk.Label(self.nav_frame, text="C# Trainer", style='Title.TLabel', anchor='center')
@@ -578,213 +4151,469 @@ class CSharpTrainerApp(tk.Tk):
         sep = ttk.Separator(self.nav_frame, orient='horizontal')
         sep.pack(fill='x', pady=10)
 
-        for module_name in modules.keys():
-            btn = ttk.Button(self.nav_frame, text=module_name, style='NavButton.TButton', 
-                             command=lambda name=module_name: self.display_content(modules[name]))
-            btn.pack(fill='x', pady=5)
+        if len(modules) > NAV_TREE_THRESHOLD:
+            self.create_navigation_tree()
+        else:
+            for module_name in modules.keys():
+                btn = ttk.Button(self.nav_frame, text=module_name, style='NavButton.TButton', 
+                                 command=lambda name=module_name: self.display_content(modules[name]))
+                btn.pack(fill='x', pady=5)
 
         sep2 = ttk.Separator(self.nav_frame, orient='horizontal')
         sep2.pack(fill='x', pady=20)
 
-        exit_btn = ttk.Button(self.nav_frame, text="Exit", command=self.quit, style='NavButton.TButton')
+        exit_btn = ttk.Button(self.nav_frame, text="Exit", command=self.on_close, style='NavButton.TButton')
         exit_btn.pack(fill='x', pady=10)
 
+    def create_navigation_tree(self):
+        # One collapsed group per content pack; a group's rows are only inserted when it is opened
+        self.nav_groups = collections.OrderedDict()
+        self.nav_items = {}
+        for module_name, module in modules.items():
+            pack = getattr(module, "pack", None)
+            group = os.path.basename(pack.root) if pack is not None else "Core"
+            self.nav_groups.setdefault(group, []).append(module_name)
+
+        tree_frame = ttk.Frame(self.nav_frame)
+        tree_frame.pack(fill='both', expand=True)
+        self.nav_tree = ttk.Treeview(tree_frame, show='tree', selectmode='browse')
+        nav_scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.nav_tree.yview)
+        self.nav_tree.configure(yscrollcommand=nav_scrollbar.set)
+        nav_scrollbar.pack(side='right', fill='y')
+        self.nav_tree.pack(side='left', fill='both', expand=True)
+
+        for group, names in self.nav_groups.items():
+            item = self.nav_tree.insert("", "end", text="%s (%d)" % (group, len(names)), open=False)
+            self.nav_items[item] = group
+            # Placeholder child so the group shows an expander before it is populated
+            self.nav_tree.insert(item, "end")
+        self.nav_tree.bind("<<TreeviewOpen>>", self.on_nav_group_opened)
+        self.nav_tree.bind("<<TreeviewSelect>>", self.on_nav_selected)
+
+    def on_nav_group_opened(self, event=None):
+        item = self.nav_tree.focus()
+        if not item or self.nav_tree.parent(item):
+            return
+        children = self.nav_tree.get_children(item)
+        if len(children) == 1 and not self.nav_tree.item(children[0], "text"):
+            self.nav_tree.delete(children[0])
+            for module_name in self.nav_groups[self.nav_items[item]]:
+                self.nav_items[self.nav_tree.insert(item, "end", text=module_name)] = module_name
+
+    def on_nav_selected(self, event=None):
+        selection = self.nav_tree.selection()
+        if not selection or not self.nav_tree.parent(selection[0]):
+            return
+        module_name = self.nav_items.get(selection[0])
+        if module_name in modules:
+            self.display_content(modules[module_name])
+
     def display_content(self, content):
         self.current_module = content
-        # Clear existing content
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
-
-        # Insert title
-        title = ttk.Label(self.content_frame, text=content["title"], style='Heading.TLabel', wraplength=900)
-        title.pack(pady=(0,10))
-
-        # Insert sections
-        for section in content["sections"]:
-            subheading = ttk.Label(self.content_frame, text=section["heading"], style='Subheading.TLabel', wraplength=900, justify='left')
-            subheading.pack(anchor='w', pady=(10,5))
-
-            content_text = section["content"]
-            # Handle code blocks and regular text
-            self.insert_content(section["content"])
-
-        # Special handling for quizzes
-        if content == quizzes_content:
-            self.display_quiz()
-        elif content == glossary_content:
-            pass  # Additional handling if needed
-        elif content == references_content:
-            pass  # Additional handling if needed
-
-        # Update progress if not quizzes
-        if content != quizzes_content:
-            self.mark_module_completed(content["title"])
-
-    def insert_content(self, content):
-        lines = content.split('\n')
-        in_code_block = False
-        code_text = ""
-
-        for line in lines:
-            if line.strip().startswith("```csharp"):
-                in_code_block = True
-                code_text = ""
-                continue
-            elif line.strip() == "```" and in_code_block:
-                in_code_block = False
-
-                # Create a frame for the code block and action button
-                code_frame = ttk.Frame(self.content_frame)
-                code_frame.pack(fill='x', pady=5)
-
-                code_widget = scrolledtext.ScrolledText(code_frame, wrap=tk.WORD, font=("Consolas", 12), bg="#f5f5f5", height=10)
-                code_widget.pack(side='left', fill='both', expand=True)
-                code_widget.insert(tk.END, code_text)
-                code_widget.configure(state='disabled')
-
-                # Button to execute code
-                exec_button = ttk.Button(code_frame, text="Execute Code", command=lambda c=code_text: self.execute_csharp_code(c))
-                exec_button.pack(side='right', padx=10, pady=5)
-
+        # Hide the previous module view; it stays alive in the view cache
+        if self.current_view is not None:
+            self.current_view.pack_forget()
+        # Before any view is destroyed below: cancelling resets the status labels of the old view
+        self.cancel_precompile()
+
+        with tracer.span("ui.display_content", module=content["title"]):
+            view = self.view_cache.get(content["title"])
+            if view is None or view.module is not content:
+                if view is not None:
+                    view.destroy()
+                view = ModuleView(self.content_area, self, content)
+                self.view_cache[content["title"]] = view
+            elif view.dark_mode != self.dark_mode:
+                # Rendered under the other theme while it was hidden
+                view.apply_palette(self.palette)
+                view.dark_mode = self.dark_mode
+            self.view_cache.move_to_end(content["title"])
+
+            self.current_view = view
+            self.current_view.pack(fill='both', expand=True)
+            self.evict_views()
+            if self.precompile and view.code_blocks:
+                self.precompile_after_id = self.after(PRECOMPILE_DELAY_MS, self.precompile_view, view)
+            if self.current_search_term:
+                view.highlight(tokenize(self.current_search_term))
+            elif view.highlight_terms:
+                # Cached view still showing the matches of a search that was cleared while it was hidden
+                view.clear_highlights()
+
+            # Update progress if not quizzes
+            if content != quizzes_content:
+                self.mark_module_completed(content["title"])
+
+    def show_glossary_term(self, term):
+        self.display_content(glossary_content)
+        self.current_view.scroll_to_term(term)
+
+    def evict_views(self):
+        while len(self.view_cache) > self.max_cached_views:
+            _, view = self.view_cache.popitem(last=False)
+            view.destroy()
+
+    def precompile_view(self, view):
+        # Compile the module's snippets in the background, the ones on screen first
+        self.precompile_after_id = None
+        if view is not self.current_view or (self.toolchain.ready and self.toolchain.backend is None):
+            return
+        visible = view.visible_code()
+        submitted = set()
+        for _, code in sorted(view.code_blocks, key=lambda block: block[1] not in visible):
+            if code in submitted:
                 continue
-
-            if in_code_block:
-                code_text += line + '\n'
+            submitted.add(code)
+            priority = PRIORITY_VISIBLE if code in visible else PRIORITY_BACKGROUND
+            self.precompile_jobs.append((view, code, self.scheduler.submit(code, priority, build_only=True)))
+        self.poll_precompile()
+
+    def poll_precompile(self):
+        self.precompile_after_id = None
+        pending = False
+        for view, code, job in self.precompile_jobs:
+            if job.compiled:
+                # Also when an Execute click took the job over and its run failed or timed out
+                status = "Ready"
+            elif job.state == "timeout":
+                status = "Precompile timed out"
+            elif job.state == "failed":
+                status = "Build failed"
+            elif job.state in ("queued", "cancelled"):
+                status = ""
             else:
-                if line.strip() == "":
-                    ttk.Label(self.content_frame, text="", style='Content.TLabel').pack()
-                else:
-                    ttk.Label(self.content_frame, text=line, style='Content.TLabel', wraplength=900, justify='left').pack(anchor='w')
+                status = "Compiling..."
+            view.set_code_status(code, status)
+            pending = pending or not job.done
+        if pending:
+            self.precompile_after_id = self.after(PRECOMPILE_POLL_MS, self.poll_precompile)
+
+    def cancel_precompile(self):
+        # Leaving a module drops its speculative builds; jobs taken over by an Execute click keep going
+        if self.precompile_after_id is not None:
+            self.after_cancel(self.precompile_after_id)
+            self.precompile_after_id = None
+        for view, code, job in self.precompile_jobs:
+            if job.build_only and not job.done:
+                job.cancel()
+                view.set_code_status(code, "")
+        self.precompile_jobs = []
 
     def execute_csharp_code(self, code):
-        # This method compiles and executes the given C# code snippet and shows the output.
-        
-        # Check if dotnet or csc is available
-        compiler = None
+        # This method compiles and executes the given C# code snippet on a worker thread and streams the output to the console.
         
-        # Prefer dotnet if available
-        if self.command_exists("dotnet"):
-            compiler = "dotnet"
-        elif self.command_exists("csc"):
-            compiler = "csc"
-        else:
+        # Before the background probe finishes the worker waits for it; afterwards a missing compiler is reported here
+        if self.toolchain.ready and self.toolchain.backend is None:
             messagebox.showerror("Error", "No C# compiler found. Please install the .NET SDK or csc.")
             return
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            cs_file = os.path.join(temp_dir, "Program.cs")
-            exe_file = os.path.join(temp_dir, "Program.dll") if compiler == "dotnet" else os.path.join(temp_dir, "Program.exe")
-
-            # Write code to file
-            with open(cs_file, "w", encoding="utf-8") as f:
-                f.write(code)
-
-            # Compile code
-            if compiler == "dotnet":
-                # Using dotnet CLI
-                # Create a simple .csproj
-                csproj_file = os.path.join(temp_dir, "Program.csproj")
-                csproj_content = """<Project Sdk="Microsoft.NET.Sdk">
-  <PropertyGroup>
-    <OutputType>Exe</OutputType>
-    <TargetFramework>net6.0</TargetFramework>
-    <ImplicitUsings>enable</ImplicitUsings>
-    <Nullable>enable</Nullable>
-  </PropertyGroup>
-</Project>
-"""
-                with open(csproj_file, "w", encoding="utf-8") as f:
-                    f.write(csproj_content)
-                
-                # Now run `dotnet build` and `dotnet run`
-                build_result = subprocess.run(["dotnet", "build", csproj_file, "-c", "Release", "-o", temp_dir],
-                                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if build_result.returncode != 0:
-                    messagebox.showerror("Compilation Error", build_result.stderr)
-                    return
+        # Clicking the snippet that is already queued or running keeps following that job
+        job = self.scheduler.submit(code, PRIORITY_INTERACTIVE)
+        if job is self.current_job and not job.done:
+            return
 
-                run_result = subprocess.run(["dotnet", exe_file], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            else:
-                # Using csc (Roslyn compiler)
-                build_result = subprocess.run(["csc", "/out:" + exe_file, cs_file],
-                                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if build_result.returncode != 0:
-                    messagebox.showerror("Compilation Error", build_result.stderr)
-                    return
+        # Only one program is shown at a time; a new click replaces the previous run
+        if self.current_job is not None and not self.current_job.done:
+            self.current_job.cancel()
 
-                # Run the compiled program
-                run_result = subprocess.run([exe_file], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.console.clear()
+        self.current_job = job
+        self.current_job_module = self.current_module["title"] if self.current_module else None
+        self.cancel_button.state(['!disabled'])
+        self.poll_execution(job)
 
-            if run_result.returncode != 0:
-                output = "Runtime Error:\n" + run_result.stderr
+    def poll_execution(self, job):
+        # Drain a bounded number of output chunks per tick and reflect the job state
+        if job is not self.current_job:
+            return
+        for _ in range(CONSOLE_CHUNKS_PER_POLL):
+            try:
+                stream, text = job.output.popleft()
+            except IndexError:
+                break
+            self.console.append(text, stream)
+
+        status = JOB_STATUS_TEXT[job.state]
+        if job.dropped:
+            status += " (%d output chunks dropped)" % job.dropped
+        self.console_status.config(text="Output - " + status)
+
+        if job.done and not job.output:
+            self.cancel_button.state(['disabled'])
+            self.progress_store.record_snippet_run(self.current_job_module, job.key or snippet_key(job.code),
+                                                   job.state, job.returncode)
+            return
+        self.after(CONSOLE_POLL_MS, self.poll_execution, job)
+
+    def cancel_execution(self):
+        if self.current_job is not None:
+            self.current_job.cancel()
+
+    def on_close(self):
+        self.cancel_precompile()
+        self.cancel_execution()
+        self.scheduler.shutdown()
+        self.build_cache.close()
+        if self.execution_host is not None:
+            self.execution_host.close()
+        if self.notes_window is not None and self.notes_window.winfo_exists():
+            self.notes_window.save_now()
+        self.progress_store.close()
+        self.destroy()
+
+    def show_cache_stats(self):
+        stats = self.build_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = 100.0 * stats["hits"] / lookups if lookups else 0.0
+        messagebox.showinfo("Build Cache", (
+            f"Cached builds: {stats['entries']}\n"
+            f"Size: {stats['size_bytes'] / 1048576:.1f} MB of {stats['max_bytes'] / 1048576:.0f} MB\n"
+            f"Hits: {stats['hits']}\n"
+            f"Misses: {stats['misses']}\n"
+            f"Hit rate: {hit_rate:.1f}%\n"
+            f"Evictions: {stats['evictions']}"
+        ))
+
+    def clear_build_cache(self):
+        self.build_cache.clear()
+        messagebox.showinfo("Build Cache", "The build cache has been cleared.")
+
+    def show_performance(self):
+        perf_win = tk.Toplevel(self)
+        perf_win.title("Performance")
+        perf_win.geometry("800x450")
+
+        columns = (("count", "Count", 70), ("mean", "Mean ms", 90), ("p50", "p50 ms", 90),
+                   ("p95", "p95 ms", 90), ("max", "Max ms", 90))
+        tree = ttk.Treeview(perf_win, columns=[column for column, _, _ in columns], selectmode='browse')
+        tree.heading("#0", text="Span")
+        tree.column("#0", width=300, anchor='w')
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='e')
+        tree.pack(fill='both', expand=True, padx=10, pady=10)
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for name, count, mean, p50, p95, maximum in tracer.summary():
+                tree.insert("", "end", text=name, values=(count, "%.1f" % (mean * 1000), "%.1f" % (p50 * 1000),
+                                                          "%.1f" % (p95 * 1000), "%.1f" % (maximum * 1000)))
+
+        buttons = ttk.Frame(perf_win)
+        buttons.pack(pady=(0, 10))
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Reset", command=lambda: (tracer.reset(), refresh())).pack(side='left', padx=5)
+        refresh()
+
+    def export_prometheus(self):
+        path = filedialog.asksaveasfilename(title="Export Prometheus Metrics", defaultextension=".prom",
+                                            filetypes=[("Prometheus text", "*.prom *.txt"), ("All files", "*")])
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(tracer.prometheus_text())
+
+    def export_chrome_trace(self):
+        path = filedialog.asksaveasfilename(title="Export Chrome Trace", defaultextension=".json",
+                                            filetypes=[("Trace JSON", "*.json"), ("All files", "*")])
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(tracer.chrome_trace(), f)
+
+    def on_toolchain_ready(self, toolchain):
+        # Runs on the probe thread
+        self.workspace_pool.target_framework = toolchain.target_framework
+        if self.prewarm > 0 and toolchain.backend == "dotnet":
+            self.workspace_pool.prewarm(self.prewarm)
+        if self.execution_host is not None:
+            if toolchain.backend == "dotnet":
+                self.execution_host.target_framework = toolchain.target_framework
+                self.execution_host.prestart()
             else:
-                output = run_result.stdout
+                self.execution_host.disabled = True
 
-            # Show output in a message box
-            messagebox.showinfo("Program Output", output.strip())
+    def display_quiz(self, parent):
+        # Build the quiz UI in its own frame; the module view embeds it after the sections.
+        # Only the widgets of the current page exist at any time.
+        quiz_frame = ttk.Frame(parent)
 
-    def command_exists(self, cmd):
-        # Check if a command exists in PATH
-        return any(
-            os.access(os.path.join(path, cmd), os.X_OK)
-            for path in os.environ["PATH"].split(os.pathsep)
-        )
-
-    def display_quiz(self):
-        # Insert quiz UI at the end of the content_frame
-        quiz_intro = ttk.Label(self.content_frame, text="Please answer the following questions:", style='Content.TLabel', wraplength=900, justify='left')
+        quiz_intro = ttk.Label(quiz_frame, text="Please answer the following questions:", style='Content.TLabel', wraplength=900, justify='left')
         quiz_intro.pack(pady=(10,10))
 
+        # Narrow the sample through the bank's (module, difficulty) tag index
+        bank = self.get_question_bank()
+        filters = ttk.Frame(quiz_frame)
+        filters.pack(anchor='w')
+        self.quiz_module_var = tk.StringVar(value=self.quiz_module or ALL_MODULES)
+        self.quiz_difficulty_var = tk.StringVar(value=self.quiz_difficulty or ANY_DIFFICULTY)
+        ttk.Label(filters, text="Module:", style='Content.TLabel').pack(side='left')
+        module_box = ttk.Combobox(filters, textvariable=self.quiz_module_var, state='readonly',
+                                  values=[ALL_MODULES] + bank.modules())
+        module_box.pack(side='left', padx=(5, 20))
+        ttk.Label(filters, text="Difficulty:", style='Content.TLabel').pack(side='left')
+        difficulty_box = ttk.Combobox(filters, textvariable=self.quiz_difficulty_var, state='readonly',
+                                      values=[ANY_DIFFICULTY] + list(DIFFICULTIES))
+        difficulty_box.pack(side='left', padx=5)
+        for box in (module_box, difficulty_box):
+            box.bind("<<ComboboxSelected>>", lambda event: self.new_quiz())
+
+        self.quiz_page_frame = ttk.Frame(quiz_frame)
+        self.quiz_page_frame.pack(fill='x')
+
+        controls = ttk.Frame(quiz_frame)
+        controls.pack(pady=20)
+        self.quiz_prev_button = ttk.Button(controls, text="Previous", command=lambda: self.show_quiz_page(-1))
+        self.quiz_prev_button.pack(side='left')
+        self.quiz_page_label = ttk.Label(controls, style='Content.TLabel')
+        self.quiz_page_label.pack(side='left', padx=10)
+        self.quiz_next_button = ttk.Button(controls, text="Next", command=lambda: self.show_quiz_page(1))
+        self.quiz_next_button.pack(side='left')
+        submit_btn = ttk.Button(controls, text="Submit", command=self.evaluate_quiz)
+        submit_btn.pack(side='left', padx=(20, 0))
+        ttk.Button(controls, text="New Quiz", command=self.new_quiz).pack(side='left', padx=(10, 0))
+
+        self.new_quiz()
+        return quiz_frame
+
+    def get_question_bank(self):
+        # Loaded when the quiz is first shown, not at startup
+        if self.question_bank is None:
+            try:
+                self.question_bank = load_question_bank(self.question_files)
+            except (OSError, ValueError) as exc:
+                messagebox.showerror("Question Bank", "Could not load the question bank: %s" % exc)
+                self.question_bank = load_question_bank()
+        return self.question_bank
+
+    def new_quiz(self):
+        bank = self.get_question_bank()
+        module = self.quiz_module_var.get()
+        difficulty = self.quiz_difficulty_var.get()
+        self.quiz_session = QuizSession(bank, bank.sample(self.quiz_length,
+                                                          module=None if module == ALL_MODULES else module,
+                                                          difficulty=None if difficulty == ANY_DIFFICULTY else difficulty))
+        self.show_quiz_page(0)
+
+    def show_quiz_page(self, step):
+        session = self.quiz_session
+        session.page = min(max(session.page + step, 0), session.page_count - 1)
+        for child in self.quiz_page_frame.winfo_children():
+            child.destroy()
+
+        # IntVars only live for the visible page; choices are kept in the session's selection array
         self.quiz_vars = []
-        for idx, quiz in enumerate(quizzes):
-            q_label = ttk.Label(self.content_frame, text=quiz["question"], style='QuizQuestion.TLabel', wraplength=900, justify='left')
+        if not session.positions:
+            ttk.Label(self.quiz_page_frame, text="No questions match these filters.",
+                      style='Content.TLabel').pack(anchor='w', pady=(10, 0))
+        for number in session.page_range():
+            quiz = session.question(number)
+            q_label = ttk.Label(self.quiz_page_frame, text="%d) %s" % (number + 1, quiz["question"]),
+                                style='QuizQuestion.TLabel', wraplength=900, justify='left')
             q_label.pack(anchor='w', pady=(10,0))
 
-            var = tk.IntVar(value=-1)
-            self.quiz_vars.append((var, quiz["answer"]))
+            selection = session.selections[number]
+            var = tk.IntVar(value=-1 if selection == UNANSWERED else selection)
+            self.quiz_vars.append(var)
             for opt_idx, option in enumerate(quiz["options"]):
-                rb = ttk.Radiobutton(self.content_frame, text=option, variable=var, value=opt_idx)
+                rb = ttk.Radiobutton(self.quiz_page_frame, text=option, variable=var, value=opt_idx,
+                                     command=lambda number=number, opt_idx=opt_idx: session.select(number, opt_idx))
                 rb.pack(anchor='w', padx=20)
 
-        submit_btn = ttk.Button(self.content_frame, text="Submit", command=self.evaluate_quiz)
-        submit_btn.pack(pady=20)
+        self.quiz_page_label.config(text="Page %d of %d" % (session.page + 1, session.page_count))
+        self.quiz_prev_button.state(['!disabled' if session.page > 0 else 'disabled'])
+        self.quiz_next_button.state(['!disabled' if session.page < session.page_count - 1 else 'disabled'])
 
     def evaluate_quiz(self):
-        score = 0
-        for var, ans in self.quiz_vars:
-            if var.get() == ans:
-                score += 1
-        messagebox.showinfo("Quiz Results", f"You scored {score} out of {len(self.quiz_vars)}")
+        session = self.quiz_session
+        if not session.positions:
+            return
+        score = session.score()
+        total = len(session.positions)
+        unanswered = total - session.answered
+        message = f"You scored {score} out of {total}"
+        if unanswered:
+            message += f" ({unanswered} unanswered)"
+        messagebox.showinfo("Quiz Results", message)
 
         # Save progress
+        self.progress_store.record_quiz_attempt("Quizzes", score, total)
         self.mark_quiz_completed()
 
+    def on_search_changed(self, *args):
+        # Debounce typing; the search runs once the user pauses
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.search_content)
+
     def search_content(self):
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+            self.search_after_id = None
+
         term = self.search_var.get().strip().lower()
         if not term:
+            self.clear_search_state()
             return
 
-        # Clear previous highlights
-        self.clear_highlights()
-
-        for widget in self.content_frame.winfo_children():
-            if isinstance(widget, ttk.Label):
-                text = widget.cget("text").lower()
-                if term in text:
-                    widget.config(style='Highlight.TLabel')
+        # Modules that were added or replaced since the last search are re-indexed first
+        with tracer.span("search.refresh_index"):
+            changed = self.search_index.refresh(modules)
+        narrowing = (not changed and self.search_candidates is not None
+                     and self.current_search_term and term.startswith(self.current_search_term))
+        self.current_search_term = term
+
+        if self.current_view is not None:
+            with tracer.span("search.highlight"):
+                self.current_view.highlight(tokenize(term))
+
+        with tracer.span("search.query", narrowing=bool(narrowing)):
+            self.search_results, self.search_candidates = self.search_index.query(
+                term, candidates=self.search_candidates if narrowing else None)
+        with tracer.span("search.show_results"):
+            self.show_search_results()
+
+    def show_search_results(self):
+        self.results_tree.delete(*self.results_tree.get_children())
+        for index, result in enumerate(self.search_results):
+            match = result.text.strip().split("\n")[0] if result.kind != "code" else self.first_matching_line(result.text)
+            self.results_tree.insert("", "end", iid=str(index), values=(result.module, result.heading, match))
+        if self.search_results:
+            self.results_frame.pack(side='top', fill='x', before=self.console_frame)
+        else:
+            self.results_frame.pack_forget()
+
+    def first_matching_line(self, code):
+        terms = tokenize(self.current_search_term)
+        for line in code.split("\n"):
+            lowered = line.lower()
+            if any(term in lowered for term in terms):
+                return line.strip()
+        return code.strip().split("\n")[0]
+
+    def on_result_selected(self, event):
+        selection = self.results_tree.selection()
+        if not selection:
+            return
+        result = self.search_results[int(selection[0])]
+        if self.current_module is not modules[result.module]:
+            self.display_content(modules[result.module])
+        self.current_view.highlight(tokenize(self.current_search_term))
+        self.current_view.scroll_to_section(result.section)
 
     def clear_search(self):
         self.search_var.set("")
+        self.clear_search_state()
+
+    def clear_search_state(self):
+        self.current_search_term = ""
+        self.search_candidates = None
         self.clear_highlights()
+        self.search_results = []
+        self.show_search_results()
 
     def clear_highlights(self):
-        for widget in self.content_frame.winfo_children():
-            if isinstance(widget, ttk.Label):
-                # Reset to normal style
-                if widget.cget("text").startswith("**") and widget.cget("text").endswith("**"):
-                    widget.config(style='Subheading.TLabel')
-                else:
-                    widget.config(style='Content.TLabel')
+        if self.current_view is not None:
+            with tracer.span("search.clear_highlights"):
+                self.current_view.clear_highlights()
 
     def toggle_dark_mode(self):
         self.dark_mode = not self.dark_mode
@@ -792,10 +4621,17 @@ class CSharpTrainerApp(tk.Tk):
             self.set_dark_mode()
         else:
             self.set_light_mode()
+        # Hidden cached views are re-themed when they are shown again
+        if self.current_view is not None:
+            self.current_view.apply_palette(self.palette)
+            self.current_view.dark_mode = self.dark_mode
 
     def set_light_mode(self):
         self.config(bg="#ffffff")
         self.style.theme_use('default')
+        self.palette = {"background": "#ffffff", "foreground": "#000000", "code_background": "#f5f5f5", "highlight": "#ffff00",
+                        "link": "#0b5cad", "keyword": "#0000ff", "string": "#a31515", "comment": "#008000",
+                        "number": "#098658", "preprocessor": "#808080"}
 
         # Configure styles
         self.style.configure('Title.TLabel', font=('Segoe UI', 24, 'bold'), background="#ffffff", foreground="#000000")
@@ -811,6 +4647,9 @@ class CSharpTrainerApp(tk.Tk):
     def set_dark_mode(self):
         self.config(bg="#2e2e2e")
         self.style.theme_use('clam')
+        self.palette = {"background": "#2e2e2e", "foreground": "#ffffff", "code_background": "#3a3a3a", "highlight": "#555555",
+                        "link": "#6cb6ff", "keyword": "#569cd6", "string": "#d69d85", "comment": "#57a64a",
+                        "number": "#b5cea8", "preprocessor": "#9b9b9b"}
 
         # Configure styles
         self.style.configure('Title.TLabel', font=('Segoe UI', 24, 'bold'), background="#2e2e2e", foreground="#ffffff")
@@ -824,55 +4663,405 @@ class CSharpTrainerApp(tk.Tk):
         self.style.configure('TLabel', background="#2e2e2e", foreground="#ffffff")
 
     def view_notes(self):
-        notes_win = tk.Toplevel(self)
-        notes_win.title("My Notes")
-        notes_win.geometry("700x500")
-        notes_win.resizable(False, False)
-
-        tk.Label(notes_win, text="Write your notes here:", font=("Segoe UI", 14, "bold")).pack(pady=10)
-        text_area = scrolledtext.ScrolledText(notes_win, wrap=tk.WORD, font=("Segoe UI", 12))
-        text_area.pack(fill='both', expand=True, padx=10, pady=10)
-        text_area.insert(tk.END, self.note_content)
-
-        def save_notes():
-            self.note_content = text_area.get("1.0", tk.END).strip()
-            self.save_progress()
-            notes_win.destroy()
-
-        ttk.Button(notes_win, text="Save Notes", command=save_notes).pack(pady=10)
+        # Opens the note of the section at the top of the current module
+        if self.current_view is None:
+            return
+        if self.notes_window is None or not self.notes_window.winfo_exists():
+            self.notes_window = NotesWindow(self, self.progress_store)
+        self.notes_window.open_note(self.current_module["title"], self.current_view.current_section())
+        self.notes_window.lift()
 
     def clear_notes(self):
-        self.note_content = ""
+        if not messagebox.askyesno("Notes", "Delete all of your notes?"):
+            return
+        self.progress_store.clear_notes()
+        if self.notes_window is not None and self.notes_window.winfo_exists():
+            self.notes_window.cleared()
         messagebox.showinfo("Notes", "Your notes have been cleared.")
 
     def mark_module_completed(self, module_title):
         if module_title not in self.progress.get("completed_modules", []):
             self.progress.setdefault("completed_modules", []).append(module_title)
-            self.save_progress()
+            self.progress_store.record("module", module_title)
 
     def mark_quiz_completed(self):
         if "Quizzes" not in self.progress.get("completed_quizzes", []):
             self.progress.setdefault("completed_quizzes", []).append("Quizzes")
-            self.save_progress()
+            self.progress_store.record("quiz", "Quizzes")
 
     def load_progress(self):
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, "r") as f:
-                return json.load(f)
-        else:
+        import sqlite3
+        try:
+            return self.progress_store.load()
+        except (OSError, sqlite3.Error) as exc:
+            print("Could not load progress from %s: %s" % (self.progress_store.path, exc), file=sys.stderr)
             return {}
 
-    def save_progress(self):
-        with open(PROGRESS_FILE, "w") as f:
-            json.dump(self.progress, f, indent=4)
+# ---------------------------
+# Benchmark Suite
+# ---------------------------
+
+DEFAULT_BENCHMARK_FILE = "benchmark_results.json"
+# A median this much slower than the baseline is reported as a regression
+BENCHMARK_REGRESSION_RATIO = 1.2
+
+STUB_COMPILER = """#!{python}
+# Stand-in for csc: writes a shell script to the /out: path
+import os, sys
+out = next(arg[5:] for arg in sys.argv[1:] if arg.startswith("/out:"))
+with open(out, "w") as f:
+    f.write("#!/bin/sh\\necho 'Hello from the stub compiler'\\n")
+os.chmod(out, 0o755)
+"""
+
+
+def synthetic_module(lines=5000, title="Synthetic Module"):
+    sections = []
+    per_section = 50
+    for index in range(max(1, lines // per_section)):
+        body = ["Paragraph line %d of section %d with **bold** text and `inline code`." % (n, index) for n in range(40)]
+        body += ["", "```csharp", 'Console.WriteLine("Section %d");' % index, "int x = %d;" % index, "```", ""]
+        sections.append({"heading": "Section %d" % index, "content": "\n".join(body)})
+    return {"title": title, "sections": sections}
+
+
+def time_runs(function, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"runs": repeat, "median_ms": round(timings[len(timings) // 2] * 1000, 3),
+            "min_ms": round(timings[0] * 1000, 3), "max_ms": round(timings[-1] * 1000, 3)}
+
+
+def core_benchmarks(root, lines):
+    # Everything that runs without a display: parsing, search, progress writes and the execution path
+    results = collections.OrderedDict()
+    module = synthetic_module(lines)
+    corpus = dict(modules, synthetic=module)
+
+    results["parse_module"] = time_runs(lambda: parse_module(module), 10,
+                                        setup=lambda: _documents.pop(module["title"], None))
+    parse_module(module)
+
+    results["search_index_build"] = time_runs(lambda: SearchIndex().refresh(corpus), 5)
+    index = SearchIndex()
+    index.refresh(corpus)
+    queries = ["console", "section 12", "writeline", "bold text", "linq", "int x"]
+    results["search_query"] = time_runs(lambda: [index.query(query) for query in queries], 20)
+
+    store = ProgressStore(os.path.join(root, "progress.db"), learner="benchmark", legacy_file=None)
+    store.load()
+    counter = itertools.count()
+
+    def save_progress():
+        for _ in range(100):
+            store.record("module", "Module %d" % next(counter))
+        store.flush()
+    results["progress_save_100"] = time_runs(save_progress, 10)
+    results["progress_load"] = time_runs(store.load, 10)
+
+    note = module["sections"][0]["content"][:2000]
+
+    def save_notes():
+        for _ in range(100):
+            number = next(counter)
+            store.save_note("Module %d" % (number % 10), "Section %d" % number, note)
+        store.flush()
+    results["notes_save_100"] = time_runs(save_notes, 10)
+    results["notes_search"] = time_runs(lambda: [store.search_notes(query) for query in queries], 20)
+    store.close()
+
+    if os.name != "nt":
+        results.update(execution_benchmarks(root))
+    return results
+
+
+def execution_benchmarks(root):
+    # Build and run phases of run_snippet against a stub compiler, so only the app's own overhead is measured
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    compiler = os.path.join(bin_dir, "csc")
+    with open(compiler, "w") as f:
+        f.write(STUB_COMPILER.format(python=sys.executable))
+    os.chmod(compiler, 0o755)
+
+    toolchain = ToolchainRegistry(cache_file=os.path.join(root, "toolchain.json"))
+    toolchain.info = {"backends": {"csc": {"version": "stub"}}, "target_framework": DEFAULT_TARGET_FRAMEWORK}
+    toolchain._ready.set()
+    pool = WorkspacePool()
+    cache = BuildCache(root=os.path.join(root, "build_cache"))
+    counter = itertools.count()
+    results = collections.OrderedDict()
+
+    def execute(code, use_cache):
+        job = ExecutionJob(code)
+        run_snippet(job, pool, toolchain, cache if use_cache else None)
+        if job.state != "finished":
+            raise RuntimeError("stub execution ended as %s: %s" % (job.state, "".join(text for _, text in job.output)))
+
+    saved_path = os.environ.get("PATH", "")
+    os.environ["PATH"] = bin_dir + os.pathsep + saved_path
+    try:
+        # Uncached: temp dir, compile and run every time; cached: a fresh build once, then only the run
+        results["execute_build_and_run"] = time_runs(lambda: execute("// %d" % next(counter), False), 10)
+        execute("// cached", True)
+        results["execute_cached_run"] = time_runs(lambda: execute("// cached", True), 10)
+    finally:
+        os.environ["PATH"] = saved_path
+        pool.close()
+    return results
+
+
+def display_benchmarks(root, lines):
+    # Needs a display (or Xvfb): rendering, switching modules and highlighting search matches
+    results = collections.OrderedDict()
+    store = ProgressStore(os.path.join(root, "display_progress.db"), learner="benchmark", legacy_file=None)
+    app = CSharpTrainerApp(progress_store=store, precompile=False)
+    try:
+        app.update()
+        module = synthetic_module(lines)
+        parse_module(module)
+        views = []
+
+        def render():
+            view = ModuleView(app.content_area, app, module)
+            view.pack(fill='both', expand=True)
+            app.update_idletasks()
+            views.append(view)
+
+        def discard():
+            while views:
+                views.pop().destroy()
+        results["render_module"] = time_runs(render, 3, setup=discard)
+        discard()
+
+        names = list(modules)[:2]
+        switches = itertools.cycle(names)
+        for name in names:
+            app.display_content(modules[name])
+        results["display_content_cached"] = time_runs(
+            lambda: (app.display_content(modules[next(switches)]), app.update_idletasks()), 20)
+
+        render()
+        view = views[-1]
+        results["highlight_and_clear"] = time_runs(lambda: (view.highlight(["section"]), view.clear_highlights()), 5)
+        discard()
+
+        def search():
+            app.search_var.set("console")
+            app.search_content()
+            app.clear_search_state()
+        results["search_content"] = time_runs(search, 10)
+    finally:
+        app.on_close()
+    return results
+
+
+def run_benchmarks(output_file=DEFAULT_BENCHMARK_FILE, core_only=False, baseline_file=None, lines=5000,
+                   stream=sys.stdout):
+    import platform
+    import tempfile
+    with open(os.path.abspath(__file__), "rb") as f:
+        script_hash = hashlib.sha256(f.read()).hexdigest()[:12]
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "script_sha256": script_hash,
+              "python": platform.python_version(), "platform": platform.platform(), "lines": lines,
+              "results": collections.OrderedDict(), "skipped": []}
+
+    with tempfile.TemporaryDirectory(prefix="csharp_bench_") as root:
+        report["results"].update(core_benchmarks(root, lines))
+        if core_only:
+            report["skipped"].append("display benchmarks (--benchmark-core)")
+        else:
+            try:
+                report["results"].update(display_benchmarks(root, lines))
+            except tk.TclError as exc:
+                # No display; run under xvfb-run to include these
+                report["skipped"].append("display benchmarks (%s)" % exc)
+
+    baseline = {}
+    if baseline_file:
+        with open(baseline_file, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = []
+    for name, result in report["results"].items():
+        line = "%-26s median %9.3f ms  min %9.3f ms" % (name, result["median_ms"], result["min_ms"])
+        previous = baseline.get(name)
+        if previous and previous["median_ms"] > 0:
+            ratio = result["median_ms"] / previous["median_ms"]
+            line += "  %+6.1f%% vs baseline" % ((ratio - 1) * 100)
+            if ratio > BENCHMARK_REGRESSION_RATIO:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line, file=stream)
+    for skipped in report["skipped"]:
+        print("skipped: " + skipped, file=stream)
+
+    if output_file:
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print("Results written to %s" % output_file, file=stream)
+    return 1 if regressions else 0
+
+
+# ---------------------------
+# Startup Profiling
+# ---------------------------
+
+DEFAULT_STARTUP_BUDGET_MS = 1500
+
+# (name, seconds since STARTUP_BEGIN) in the order they were reached
+startup_marks = []
+
+def mark_startup(name):
+    startup_marks.append((name, time.perf_counter() - STARTUP_BEGIN))
+
+def report_startup(stream=sys.stdout):
+    previous = 0.0
+    for name, elapsed in startup_marks:
+        print("%-14s %8.1f ms  (+%.1f ms)" % (name, elapsed * 1000, (elapsed - previous) * 1000), file=stream)
+        previous = elapsed
+
+def startup_elapsed_ms(name):
+    for mark, elapsed in startup_marks:
+        if mark == name:
+            return elapsed * 1000
+    return None
 
 # ---------------------------
 # Main Function
 # ---------------------------
 
 def main():
-    app = CSharpTrainerApp()
+    mark_startup("imports")
+    parser = argparse.ArgumentParser(description="C# Trainer - Professional Edition")
+    parser.add_argument("--prewarm", type=int, default=0, metavar="N",
+                        help="prepare N dotnet build workspaces in the background at startup")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_BUILD_CACHE_MB, metavar="MB",
+                        help="size cap of the on-disk build cache (default: %(default)s MB)")
+    parser.add_argument("--run-timeout", type=int, default=10, metavar="SECONDS",
+                        help="wall-clock and CPU time limit for a running snippet (default: %(default)s)")
+    parser.add_argument("--build-timeout", type=int, default=120, metavar="SECONDS",
+                        help="wall-clock limit for compiling a snippet (default: %(default)s)")
+    parser.add_argument("--memory-limit", type=int, default=512, metavar="MB",
+                        help="memory cap for a running snippet (default: %(default)s)")
+    parser.add_argument("--no-precompile", action="store_true",
+                        help="do not compile the snippets of the shown module in the background")
+    parser.add_argument("--execution-host", action="store_true",
+                        help="run compiled snippets in one long-lived dotnet process instead of starting one per run")
+    parser.add_argument("--content-dir", action="append", metavar="DIR",
+                        help="load extra course modules from content packs in DIR (repeatable; default: content_packs/)")
+    parser.add_argument("--validate-snippets", action="store_true",
+                        help="compile every lesson code block without opening the window and report pass/fail")
+    parser.add_argument("--report", metavar="FILE", help="write the --validate-snippets, --grade-exercises, --class-summary or --grade-quizzes results to FILE")
+    parser.add_argument("--benchmark-parse", type=int, nargs="?", const=5000, metavar="LINES",
+                        help="compare the old per-display line scan with the parsed document model")
+    parser.add_argument("--cached-views", type=int, default=DEFAULT_CACHED_VIEWS, metavar="N",
+                        help="number of rendered modules kept alive for instant switching (default: %(default)s)")
+    parser.add_argument("--benchmark-render", type=int, nargs="?", const=5000, metavar="LINES",
+                        help="render a synthetic module of LINES lines (default 5000) and report time and widget count")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print time to first paint and time to interactive")
+    parser.add_argument("--startup-budget", type=int, nargs="?", const=DEFAULT_STARTUP_BUDGET_MS, metavar="MS",
+                        help="start the app, quit once it is interactive and exit 1 if that took longer "
+                             "than MS (default %d)" % DEFAULT_STARTUP_BUDGET_MS)
+    parser.add_argument("--learner", metavar="NAME",
+                        help="record progress under this learner profile (default: the login name)")
+    parser.add_argument("--progress-db", default=PROGRESS_DB_FILE, metavar="FILE",
+                        help="progress database, which may be shared by every learner of a lab (default: %(default)s)")
+    parser.add_argument("--class-summary", action="store_true",
+                        help="print per-learner completion counts from the progress database and exit")
+    parser.add_argument("--question-bank", action="append", default=[], metavar="FILE",
+                        help="add the questions in a JSON Lines file to the quiz question bank (repeatable)")
+    parser.add_argument("--quiz-length", type=int, default=QUIZ_LENGTH, metavar="N",
+                        help="number of questions sampled for each quiz (default: %(default)s)")
+    parser.add_argument("--quiz-module", metavar="NAME",
+                        help="sample quizzes only from questions tagged with this module")
+    parser.add_argument("--quiz-difficulty", choices=DIFFICULTIES,
+                        help="sample quizzes only from questions of this difficulty")
+    parser.add_argument("--grade-exercises", metavar="SUBMISSIONS",
+                        help="compile and run every student submission (NAME.cs or NAME/ directory) in SUBMISSIONS "
+                             "against the --fixtures and print a per-student report")
+    parser.add_argument("--fixtures", metavar="DIR",
+                        help="expected outputs for --grade-exercises: NAME.out or NAME.regex, plus optional NAME.in")
+    parser.add_argument("--match", choices=MATCH_MODES, default="exact",
+                        help="how NAME.out fixtures are compared with the program output (default: %(default)s)")
+    parser.add_argument("--grade-quizzes", metavar="SUBMISSIONS",
+                        help="score a JSON Lines file of quiz submissions ('-' for stdin) against the question bank "
+                             "and write one result line per submission to --report or stdout")
+    parser.add_argument("--benchmark", nargs="?", const=DEFAULT_BENCHMARK_FILE, metavar="FILE",
+                        help="run the benchmark suite and write the results as JSON (default: %s)"
+                             % DEFAULT_BENCHMARK_FILE)
+    parser.add_argument("--benchmark-core", action="store_true",
+                        help="with --benchmark, skip the benchmarks that need a display")
+    parser.add_argument("--benchmark-baseline", metavar="FILE",
+                        help="with --benchmark, compare against an earlier results file and exit 1 on regressions")
+    args = parser.parse_args()
+
+    if args.grade_quizzes:
+        graded, errors = grade_quizzes(args.grade_quizzes, args.question_bank, output_file=args.report)
+        sys.exit(1 if errors else 0)
+
+    if args.class_summary:
+        print_class_summary(ProgressStore(args.progress_db, learner=args.learner), report_file=args.report)
+        return
+
+    register_content_packs(args.content_dir or [CONTENT_PACKS_DIR])
+    mark_startup("content_packs")
+
+    if args.benchmark:
+        sys.exit(run_benchmarks(args.benchmark, core_only=args.benchmark_core,
+                                baseline_file=args.benchmark_baseline))
+
+    if args.benchmark_parse:
+        benchmark_parse(args.benchmark_parse)
+        return
+
+    if args.benchmark_render:
+        benchmark_render(args.benchmark_render)
+        return
+
+    if args.validate_snippets:
+        toolchain = ToolchainRegistry()
+        toolchain.load()
+        sys.exit(validate_snippets(modules, toolchain, report_file=args.report))
+
+    limits = ExecutionLimits(build_timeout=args.build_timeout, run_timeout=args.run_timeout,
+                             cpu_seconds=args.run_timeout, memory_mb=args.memory_limit)
+
+    if args.grade_exercises:
+        if not args.fixtures:
+            parser.error("--grade-exercises needs --fixtures DIR")
+        toolchain = ToolchainRegistry()
+        toolchain.load()
+        sys.exit(grade_exercises(args.grade_exercises, args.fixtures, toolchain, match=args.match, limits=limits,
+                                 report_file=args.report))
+    on_interactive = None
+    if args.profile_startup or args.startup_budget:
+        def on_interactive(app):
+            report_startup()
+            if args.startup_budget:
+                app.on_close()
+
+    app = CSharpTrainerApp(prewarm=args.prewarm, cache_size_mb=args.cache_size, limits=limits,
+                           cached_views=args.cached_views, on_interactive=on_interactive,
+                           progress_store=ProgressStore(args.progress_db, learner=args.learner),
+                           question_files=args.question_bank, quiz_length=args.quiz_length,
+                           quiz_module=args.quiz_module, quiz_difficulty=args.quiz_difficulty,
+                           execution_host=args.execution_host, precompile=not args.no_precompile)
     app.mainloop()
 
+    if args.startup_budget:
+        elapsed = startup_elapsed_ms("interactive")
+        if elapsed is None or elapsed > args.startup_budget:
+            print("Startup took %s ms, over the %d ms budget" % ("?" if elapsed is None else "%.0f" % elapsed,
+                                                                args.startup_budget), file=sys.stderr)
+            sys.exit(1)
+        print("Startup within budget (%.0f ms of %d ms)" % (elapsed, args.startup_budget))
+
 if __name__ == "__main__":
     main()